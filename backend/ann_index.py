@@ -0,0 +1,102 @@
+import faiss
+import numpy as np
+from typing import Dict
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+DEFAULT_INDEX_PARAMS = {
+    "hnsw_m": 32,
+    "ef_construction": 200,
+    "ef_search": 64,
+    "nlist": 1024,
+    "nprobe": 16,
+    "pq_m": 64,
+    "pq_nbits": 8,
+    "train_sample_size": 100_000,
+    "recall_k": 10,
+    "recall_queries": 200
+}
+
+MIN_POINTS_PER_CENTROID = 39
+
+def resolve_params(index_params: Dict = None) -> Dict:
+    params = dict(DEFAULT_INDEX_PARAMS)
+    params.update(index_params or {})
+    return params
+
+def index_kind(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexShards):
+        return index_kind(faiss.downcast_index(index.at(0)))
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexFlat):
+        return "flat"
+    return type(index).__name__
+
+def min_training_points(index_type: str, params: Dict) -> int:
+    if index_type == "ivf_pq":
+        return max(2 ** params["pq_nbits"], MIN_POINTS_PER_CENTROID)
+    if index_type == "ivf_flat":
+        return MIN_POINTS_PER_CENTROID
+    return 0
+
+def _training_sample(vectors: np.ndarray, sample_size: int) -> np.ndarray:
+    if len(vectors) <= sample_size:
+        return vectors
+    rows = np.random.default_rng(0).choice(len(vectors), size=sample_size, replace=False)
+    return vectors[np.sort(rows)]
+
+def build_index(index_type: str, vectors: np.ndarray, params: Dict) -> faiss.Index:
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type}. Expected one of {INDEX_TYPES}.")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"])
+        index.hnsw.efConstruction = params["ef_construction"]
+    else:
+        if count < min_training_points(index_type, params):
+            raise ValueError(f"{index_type} needs at least {min_training_points(index_type, params)} vectors to train, got {count}.")
+        nlist = max(1, min(params["nlist"], count // MIN_POINTS_PER_CENTROID))
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            if dim % params["pq_m"] != 0:
+                raise ValueError(f"pq_m={params['pq_m']} must divide the embedding dimension {dim}.")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, params["pq_m"], params["pq_nbits"])
+        index.train(_training_sample(vectors, params["train_sample_size"]))
+
+    index.add(vectors)
+    set_search_params(index, nprobe=params["nprobe"], ef_search=params["ef_search"])
+    return index
+
+def set_search_params(index: faiss.Index, nprobe: int = None, ef_search: int = None):
+    if isinstance(index, faiss.IndexShards):
+        for i in range(index.count()):
+            set_search_params(faiss.downcast_index(index.at(i)), nprobe=nprobe, ef_search=ef_search)
+        return
+    if nprobe is not None and isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(nprobe, index.nlist)
+    if ef_search is not None and isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+def recall_against_flat(index: faiss.Index, vectors: np.ndarray, k: int = 10, num_queries: int = 200) -> float:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    k = min(k, len(vectors))
+    if k == 0:
+        return 1.0
+    queries = _training_sample(vectors, num_queries)
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    _, expected = flat.search(queries, k)
+    _, found = index.search(queries, k)
+    hits = sum(len(set(e) & set(f)) for e, f in zip(expected, found))
+    return hits / (len(queries) * k)
@@ -0,0 +1,107 @@
+import re
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+from backend.logging import get_logger
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip(" ?!.")
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    source_documents: List[Any]
+    scope: Hashable
+    vector: Optional[np.ndarray] = None
+    created_at: float = field(default_factory=time.time)
+
+class AnswerCache:
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600):
+        self.logger = get_logger(self.__class__.__name__)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, CachedAnswer]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, int] = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0
+        }
+
+    def _expired(self, entry: CachedAnswer) -> bool:
+        return self.ttl_seconds is not None and time.time() - entry.created_at > self.ttl_seconds
+
+    def _get(self, key: Tuple) -> Optional[CachedAnswer]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            del self._entries[key]
+            self.metrics["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def lookup(self, question: str, scope: Hashable, chunk_ids: Sequence[str]) -> Optional[CachedAnswer]:
+        key = (normalize_question(question), scope, tuple(chunk_ids))
+        with self._lock:
+            entry = self._get(key)
+            self.metrics["exact_hits" if entry else "misses"] += 1
+        return entry
+
+    def lookup_similar(self, vector: Sequence[float], scope: Hashable, threshold: float) -> Optional[CachedAnswer]:
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        best, best_score = None, threshold
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.scope != scope or entry.vector is None:
+                    continue
+                if self._expired(entry):
+                    del self._entries[key]
+                    self.metrics["expirations"] += 1
+                    continue
+                score = float(np.dot(entry.vector, query))
+                if score >= best_score:
+                    best, best_score = key, score
+            if best is None:
+                return None
+            self.metrics["semantic_hits"] += 1
+            self._entries.move_to_end(best)
+            entry = self._entries[best]
+        self.logger.info(f"Semantic cache hit ({best_score:.3f}) for cached question: {entry.question}")
+        return entry
+
+    def store(self, question: str, scope: Hashable, chunk_ids: Sequence[str], answer: str,
+              source_documents: List[Any], vector: Sequence[float] = None):
+        if vector is not None:
+            vector = np.asarray(vector, dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+        key = (normalize_question(question), scope, tuple(chunk_ids))
+        with self._lock:
+            self._entries[key] = CachedAnswer(question, answer, source_documents, scope, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.metrics["evictions"] += 1
+
+    def invalidate(self, *_):
+        with self._lock:
+            if self._entries:
+                self.logger.info(f"Invalidating {len(self._entries)} cached answers.")
+            self._entries.clear()
+            self.metrics["invalidations"] += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.metrics["exact_hits"] + self.metrics["semantic_hits"] + self.metrics["misses"]
+            hits = self.metrics["exact_hits"] + self.metrics["semantic_hits"]
+            return dict(self.metrics, size=len(self._entries), hit_rate=hits / lookups if lookups else 0.0)
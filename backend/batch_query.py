@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Set
+from backend.embedding_stage import text_hash
+from backend.pipeline_config import PipelineConfig
+from backend.rag_pipeline import RAGPipeline
+from backend.token_budget import estimate_tokens
+from backend.metrics import get_metrics
+from backend.logging import get_logger
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        if rate_per_minute <= 0:
+            raise ValueError(f"Rate must be positive, got {rate_per_minute}.")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0):
+        needed = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= amount
+                    return
+                delay = (needed - self._tokens) / self.rate
+            time.sleep(delay)
+
+def read_questions(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        items = json.loads(text)
+    else:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    questions = []
+    for i, item in enumerate(items):
+        if isinstance(item, str):
+            item = {"question": item}
+        if not isinstance(item, dict) or not item.get("question"):
+            raise ValueError(f"Item {i} in {path} has no question.")
+        item = dict(item)
+        item["id"] = str(item["id"]) if "id" in item else text_hash(item["question"])[:16]
+        questions.append(item)
+    return questions
+
+def completed_ids(path: str) -> Set[str]:
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" not in record:
+                done.add(str(record["id"]))
+    return done
+
+def _drop_partial_line(path: str):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+class BatchQueryRunner:
+    def __init__(self, pipeline, batch_size: int = 64, max_concurrency: int = 8, requests_per_minute: float = None,
+                 tokens_per_minute: float = None, max_retries: int = 5, backoff_seconds: float = 1.0):
+        self.logger = get_logger(self.__class__.__name__)
+        self.metrics = get_metrics()
+        self.pipeline = pipeline
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def _call_llm(self, fn, tokens: int):
+        for attempt in range(self.max_retries + 1):
+            if self.request_bucket is not None:
+                self.request_bucket.acquire()
+            if self.token_bucket is not None:
+                self.token_bucket.acquire(tokens)
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random() * 0.25)
+                self.logger.warning(f"LLM call failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    def _rewrite(self, question: str) -> str:
+        return self._call_llm(lambda: self.pipeline.query_rewriter.rewrite(question), estimate_tokens(question))
+
+    def _answer(self, item: Dict, search_question: str, docs) -> Dict:
+        record = dict(item)
+        if search_question != item["question"]:
+            record["search_question"] = search_question
+        start = time.perf_counter()
+        try:
+            tokens = estimate_tokens(search_question) + sum(estimate_tokens(doc.page_content) for doc in docs)
+            record["answer"] = self._call_llm(lambda: self.pipeline.generate(search_question, docs), tokens)
+        except Exception as e:
+            self.logger.error(f"Failed to answer question {item['id']}: {e}")
+            record["error"] = str(e)
+            return record
+        record["contexts"] = [doc.page_content for doc in docs]
+        record["sources"] = [
+            {"source": doc.metadata.get("source"), "page": doc.metadata.get("page"), "chunk_id": doc.metadata.get("chunk_id") or doc.id}
+            for doc in docs
+        ]
+        record["seconds"] = round(time.perf_counter() - start, 4)
+        return record
+
+    def _prepare(self, batch: List[Dict], executor: ThreadPoolExecutor) -> List:
+        questions = [item["question"] for item in batch]
+        search_questions = list(executor.map(self._rewrite, questions)) if self.pipeline.rewrite else questions
+        return list(zip(batch, search_questions, self.pipeline.retrieve_batch(questions, search_questions)))
+
+    def _drain(self, futures: Set, out, stats: Dict, limit: int) -> Set:
+        while len(futures) > limit:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._write(out, stats, future.result())
+            out.flush()
+        return futures
+
+    def _write(self, out, stats: Dict, record: Dict):
+        status = "failed" if "error" in record else "answered"
+        stats[status] += 1
+        self.metrics.inc("rag_batch_questions_total", status=status)
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def run(self, questions: List[Dict], output_path: str) -> Dict:
+        done = completed_ids(output_path)
+        pending, seen = [], set(done)
+        for item in questions:
+            if item["id"] not in seen:
+                seen.add(item["id"])
+                pending.append(item)
+        stats = {"answered": 0, "failed": 0, "skipped": len(questions) - len(pending)}
+        self.logger.info(f"Answering {len(pending)} questions ({stats['skipped']} already answered or duplicated) into {output_path}.")
+
+        start = time.perf_counter()
+        _drop_partial_line(output_path)
+        with open(output_path, "a", encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="batch-query") as executor:
+            in_flight = set()
+            for offset in range(0, len(pending), self.batch_size):
+                batch = pending[offset:offset + self.batch_size]
+                try:
+                    prepared = self._prepare(batch, executor)
+                except Exception as e:
+                    self.logger.error(f"Failed to retrieve context for {len(batch)} questions: {e}")
+                    for item in batch:
+                        self._write(out, stats, dict(item, error=str(e)))
+                    continue
+                in_flight.update(executor.submit(self._answer, *entry) for entry in prepared)
+                in_flight = self._drain(in_flight, out, stats, self.max_concurrency * 2)
+                self.logger.info(f"Retrieved {min(offset + self.batch_size, len(pending))}/{len(pending)} questions, "
+                                 f"{stats['answered']} answered, {stats['failed']} failed.")
+            self._drain(in_flight, out, stats, 0)
+
+        stats["seconds"] = round(time.perf_counter() - start, 2)
+        stats["questions_per_second"] = round((stats["answered"] + stats["failed"]) / max(stats["seconds"], 1e-9), 2)
+        self.logger.info(f"Batch finished: {stats}")
+        return stats
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Answer a JSON or JSONL question file through the RAG pipeline.")
+    parser.add_argument("questions", help="JSON array or JSONL file with a 'question' field per item (optional 'id').")
+    parser.add_argument("--output", help="JSONL output, resumed if it already exists. Defaults to <questions>.answers.jsonl.")
+    parser.add_argument("--urls", nargs="*", default=[], help="PDF URLs to load before answering.")
+    parser.add_argument("--persist-directory", default="faiss_index")
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--prompt-type", default="zero_shot")
+    parser.add_argument("--instruction", default=None)
+    parser.add_argument("--retriever-k", type=int, default=4)
+    parser.add_argument("--top-k-chunks", type=int, default=20)
+    parser.add_argument("--hybrid", action="store_true", help="Fuse BM25 with vector search.")
+    parser.add_argument("--rerank", action="store_true")
+    parser.add_argument("--rerank-mode", default="parent")
+    parser.add_argument("--rewrite", action="store_true")
+    parser.add_argument("--fusion", action="store_true", help="Fuse results for the original and rewritten question.")
+    parser.add_argument("--context-token-budget", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=64, help="Questions embedded, searched and reranked together.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent LLM calls.")
+    parser.add_argument("--requests-per-minute", type=float, default=None)
+    parser.add_argument("--tokens-per-minute", type=float, default=None)
+    parser.add_argument("--metrics-output", default=None, help="Write Prometheus metrics to this file when done.")
+    args = parser.parse_args(argv)
+
+    config = PipelineConfig(
+        prompt_type=args.prompt_type,
+        additional_instruction=args.instruction,
+        rewrite=args.rewrite,
+        rewrite_fusion=args.fusion,
+        context_token_budget=args.context_token_budget,
+        retrieval_mode="hybrid" if args.hybrid else "dense",
+        use_reranking=args.rerank,
+        rerank_mode=args.rerank_mode,
+        retriever_k=args.retriever_k,
+        top_k_chunks=args.top_k_chunks,
+        answer_cache=False
+    )
+    pipeline = RAGPipeline(index_type=args.index_type, persist_directory=args.persist_directory, config=config)
+    if args.urls:
+        pipeline.load_documents(args.urls)
+    if pipeline.vectorstore is None:
+        parser.error(f"No vectorstore found in {args.persist_directory}. Pass --urls to load documents first.")
+    pipeline.warm_up()
+
+    output = args.output or str(Path(args.questions).with_suffix(".answers.jsonl"))
+    runner = BatchQueryRunner(
+        pipeline,
+        batch_size=args.batch_size,
+        max_concurrency=args.concurrency,
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute
+    )
+    stats = runner.run(read_questions(args.questions), output)
+    if args.metrics_output:
+        get_metrics().write(args.metrics_output)
+    print(json.dumps(stats, indent=2))
+    return 1 if stats["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import hashlib
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+CHUNK_UNITS = ("chars", "tokens")
+PAGE_SEPARATOR = "\n\n"
+TOKEN_ENCODING = "cl100k_base"
+PARALLEL_MIN_CHARS = 2_000_000
+
+Page = Tuple[int, str]
+
+class ChunkRecord(NamedTuple):
+    chunk_id: str
+    index: int
+    page: int
+    page_end: int
+    start: int
+    end: int
+    text: str
+
+class ChunkingOptions(NamedTuple):
+    chunk_size: int = 800
+    chunk_overlap: int = 80
+    unit: str = "chars"
+    respect_pages: bool = True
+
+    @property
+    def cache_variant(self) -> str:
+        return f"{self.chunk_size}_{self.chunk_overlap}_{self.unit}_{'pages' if self.respect_pages else 'flow'}"
+
+@lru_cache(maxsize=16)
+def _splitter(options: ChunkingOptions) -> RecursiveCharacterTextSplitter:
+    if options.unit not in CHUNK_UNITS:
+        raise ValueError(f"Unknown chunk unit: {options.unit}. Expected one of {CHUNK_UNITS}.")
+    if options.unit == "tokens":
+        return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            encoding_name=TOKEN_ENCODING,
+            chunk_size=options.chunk_size,
+            chunk_overlap=options.chunk_overlap
+        )
+    return RecursiveCharacterTextSplitter(chunk_size=options.chunk_size, chunk_overlap=options.chunk_overlap)
+
+def chunk_id(parent_id: str, start: int, text: str) -> str:
+    digest = hashlib.blake2b(f"{parent_id}\0{start}\0{text}".encode("utf-8"), digest_size=8).hexdigest()
+    return f"{parent_id}_{digest}"
+
+def _locate(text: str, pieces: List[str], offset: int) -> List[Tuple[int, int, str]]:
+    located = []
+    cursor = 0
+    for piece in pieces:
+        start = text.find(piece, cursor)
+        if start == -1:
+            start = cursor
+        located.append((offset + start, offset + start + len(piece), piece))
+        cursor = start + 1
+    return located
+
+def chunk_pages(pages: Sequence[Page], parent_id: str, options: ChunkingOptions = ChunkingOptions()) -> List[ChunkRecord]:
+    pages = sorted(pages, key=lambda page: page[0])
+    splitter = _splitter(options)
+    page_numbers, page_starts = [], []
+    offset = 0
+    for number, text in pages:
+        page_numbers.append(number)
+        page_starts.append(offset)
+        offset += len(text) + len(PAGE_SEPARATOR)
+
+    if options.respect_pages:
+        located = []
+        for (number, text), start in zip(pages, page_starts):
+            located.extend(_locate(text, splitter.split_text(text), start))
+    else:
+        full_text = PAGE_SEPARATOR.join(text for _, text in pages)
+        located = _locate(full_text, splitter.split_text(full_text), 0)
+
+    records = []
+    for index, (start, end, text) in enumerate(located):
+        first = page_numbers[max(0, bisect_right(page_starts, start) - 1)] if page_numbers else 0
+        last = page_numbers[max(0, bisect_right(page_starts, max(start, end - 1)) - 1)] if page_numbers else 0
+        records.append(ChunkRecord(chunk_id(parent_id, start, text), index, first, last, start, end, text))
+    return records
+
+def to_documents(records: Sequence[ChunkRecord], parent_id: str, source: str) -> List[Document]:
+    total = len(records)
+    return [
+        Document(
+            id=record.chunk_id,
+            page_content=record.text,
+            metadata={
+                "source": source,
+                "page": record.page,
+                "page_end": record.page_end,
+                "start_index": record.start,
+                "end_index": record.end,
+                "parent_id": parent_id,
+                "chunk_id": record.chunk_id,
+                "chunk_index": record.index,
+                "total_chunks": total
+            }
+        )
+        for record in records
+    ]
+
+def _chunk_job(pages: Sequence[Page], parent_id: str, source: str, options: ChunkingOptions) -> List[Document]:
+    return to_documents(chunk_pages(pages, parent_id, options), parent_id, source)
+
+def chunk_sources(sources: Dict[str, Tuple[str, Sequence[Page]]], options: ChunkingOptions = ChunkingOptions(),
+                  max_workers: int = None, parallel_min_chars: int = PARALLEL_MIN_CHARS) -> List[Document]:
+    total_chars = sum(len(text) for _, pages in sources.values() for _, text in pages)
+    if len(sources) < 2 or total_chars < parallel_min_chars or max_workers == 1:
+        return [doc for source, (parent_id, pages) in sources.items() for doc in _chunk_job(pages, parent_id, source, options)]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_chunk_job, pages, parent_id, source, options) for source, (parent_id, pages) in sources.items()]
+        return [doc for future in futures for doc in future.result()]
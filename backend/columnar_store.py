@@ -0,0 +1,251 @@
+import json
+import mmap
+import faiss
+import hashlib
+import numpy as np
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from langchain.schema import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+
+INDEX_FILE = "index.faiss"
+IDS_FILE = "ids.txt"
+TEXTS_FILE = "texts.bin"
+TEXT_OFFSETS_FILE = "text_offsets.npy"
+METADATA_FILE = "metadata.bin"
+METADATA_OFFSETS_FILE = "metadata_offsets.npy"
+ID_OFFSETS_FILE = "id_offsets.npy"
+ID_HASHES_FILE = "id_hashes.npy"
+ID_ORDER_FILE = "id_order.npy"
+PARENT_METADATA_FILE = "parent_metadata.json"
+
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+def _map_file(path: Path) -> Union[mmap.mmap, bytes]:
+    if path.stat().st_size == 0:
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _id_hash(doc_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _id_lookup(ids) -> Tuple[np.ndarray, np.ndarray]:
+    hashes = np.fromiter((_id_hash(doc_id) for doc_id in ids), dtype=np.uint64, count=len(ids))
+    order = np.argsort(hashes, kind="stable")
+    return hashes[order], order
+
+def _shared_metadata(metadatas: Iterator[Dict]) -> Dict[str, Dict]:
+    shared, counts = {}, {}
+    for metadata in metadatas:
+        parent_id = metadata.get("parent_id")
+        if not isinstance(parent_id, str):
+            continue
+        counts[parent_id] = counts.get(parent_id, 0) + 1
+        if parent_id not in shared:
+            shared[parent_id] = {key: value for key, value in metadata.items() if key != "parent_id"}
+            continue
+        common = shared[parent_id]
+        for key in [key for key, value in common.items() if key not in metadata or metadata[key] != value]:
+            del common[key]
+    return {parent_id: common for parent_id, common in shared.items() if common and counts[parent_id] > 1}
+
+class MappedIds:
+    def __init__(self, folder: Path = None):
+        self._data = b""
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._order = np.empty(0, dtype=np.int64)
+        if folder is not None:
+            self._open(folder)
+
+    def _open(self, folder: Path):
+        self._data = _map_file(folder / IDS_FILE)
+        if (folder / ID_OFFSETS_FILE).exists():
+            self._offsets = np.load(folder / ID_OFFSETS_FILE, mmap_mode="r")
+            self._hashes = np.load(folder / ID_HASHES_FILE, mmap_mode="r")
+            self._order = np.load(folder / ID_ORDER_FILE, mmap_mode="r")
+        else:
+            newlines = np.flatnonzero(np.frombuffer(self._data, dtype=np.uint8) == ord("\n"))
+            self._offsets = np.concatenate(([0], newlines + 1)).astype(np.int64)
+            self._hashes, self._order = _id_lookup(self)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return self._data[self._offsets[row]:self._offsets[row + 1] - 1].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def row(self, doc_id: str) -> Optional[int]:
+        h = np.uint64(_id_hash(doc_id))
+        i = int(np.searchsorted(self._hashes, h))
+        while i < len(self._hashes) and self._hashes[i] == h:
+            row = int(self._order[i])
+            if self[row] == doc_id:
+                return row
+            i += 1
+        return None
+
+class IndexToDocstoreId(MutableMapping):
+    def __init__(self, ids: MappedIds):
+        self._ids = ids
+        self._added: Dict[int, str] = {}
+        self._deleted = set()
+
+    def __getitem__(self, row: int) -> str:
+        if row in self._added:
+            return self._added[row]
+        if row in self._deleted or not isinstance(row, (int, np.integer)) or not 0 <= row < len(self._ids):
+            raise KeyError(row)
+        return self._ids[int(row)]
+
+    def __setitem__(self, row: int, doc_id: str):
+        self._deleted.discard(row)
+        self._added[row] = doc_id
+
+    def __delitem__(self, row: int):
+        if row in self._added:
+            del self._added[row]
+        elif row in self:
+            self._deleted.add(row)
+        else:
+            raise KeyError(row)
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._deleted) + sum(1 for row in self._added if not 0 <= row < len(self._ids))
+
+    def __iter__(self) -> Iterator[int]:
+        for row in range(len(self._ids)):
+            if row not in self._deleted:
+                yield row
+        yield from (row for row in self._added if not 0 <= row < len(self._ids))
+
+class ColumnarDocstore(Docstore, AddableMixin):
+    def __init__(self, folder: Union[str, Path] = None):
+        self._ids = MappedIds()
+        self._texts = b""
+        self._metadata = b""
+        self._text_offsets = np.zeros(1, dtype=np.int64)
+        self._metadata_offsets = np.zeros(1, dtype=np.int64)
+        self._parents: Dict[str, Dict] = {}
+        self._added: Dict[str, Document] = {}
+        self._deleted = set()
+        if folder is not None:
+            self._open(Path(folder))
+
+    def _open(self, folder: Path):
+        self._ids = MappedIds(folder)
+        self._texts = _map_file(folder / TEXTS_FILE)
+        self._metadata = _map_file(folder / METADATA_FILE)
+        self._text_offsets = np.load(folder / TEXT_OFFSETS_FILE, mmap_mode="r")
+        self._metadata_offsets = np.load(folder / METADATA_OFFSETS_FILE, mmap_mode="r")
+        if (folder / PARENT_METADATA_FILE).exists():
+            self._parents = json.loads((folder / PARENT_METADATA_FILE).read_text(encoding="utf-8"))
+
+    def _read(self, doc_id: str, row: int) -> Document:
+        text = self._texts[self._text_offsets[row]:self._text_offsets[row + 1]].decode("utf-8")
+        metadata = json.loads(self._metadata[self._metadata_offsets[row]:self._metadata_offsets[row + 1]])
+        parent = self._parents.get(metadata.get("parent_id"))
+        if parent:
+            metadata = {**parent, **metadata}
+        return Document(id=doc_id, page_content=text, metadata=metadata)
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._added) - len(self._deleted)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id not in self._deleted and (doc_id in self._added or self._ids.row(doc_id) is not None)
+
+    def search(self, search: str) -> Union[str, Document]:
+        if search in self._deleted:
+            return f"ID {search} not found."
+        if search in self._added:
+            return self._added[search]
+        row = self._ids.row(search)
+        if row is None:
+            return f"ID {search} not found."
+        return self._read(search, row)
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = [doc_id for doc_id in texts if doc_id in self]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        for doc_id in texts:
+            self._deleted.discard(doc_id)
+        self._added.update(texts)
+
+    def delete(self, ids: List) -> None:
+        missing = [doc_id for doc_id in ids if doc_id not in self]
+        if missing:
+            raise ValueError(f"Tried to delete ids that does not exist: {missing}")
+        for doc_id in ids:
+            self._added.pop(doc_id, None)
+            if self._ids.row(doc_id) is not None:
+                self._deleted.add(doc_id)
+
+    def items(self) -> Iterator[Tuple[str, Document]]:
+        for row, doc_id in enumerate(self._ids):
+            if doc_id not in self._deleted:
+                yield doc_id, self._read(doc_id, row)
+        yield from self._added.items()
+
+def save_columnar(store: FAISS, folder: Union[str, Path]):
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    faiss.write_index(store.index, str(folder / INDEX_FILE))
+
+    ids = [store.index_to_docstore_id[i] for i in range(store.index.ntotal)]
+    parents = _shared_metadata(store.docstore.search(doc_id).metadata for doc_id in ids)
+    text_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    metadata_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    with open(folder / TEXTS_FILE, "wb") as texts, open(folder / METADATA_FILE, "wb") as metadata:
+        for row, doc_id in enumerate(ids):
+            doc = store.docstore.search(doc_id)
+            text = doc.page_content.encode("utf-8")
+            shared = parents.get(doc.metadata.get("parent_id"), {})
+            row_metadata = {key: value for key, value in doc.metadata.items() if key not in shared}
+            meta = json.dumps(row_metadata, default=str, separators=(",", ":")).encode("utf-8")
+            texts.write(text)
+            metadata.write(meta)
+            text_offsets[row + 1] = text_offsets[row] + len(text)
+            metadata_offsets[row + 1] = metadata_offsets[row] + len(meta)
+    np.save(folder / TEXT_OFFSETS_FILE, text_offsets)
+    np.save(folder / METADATA_OFFSETS_FILE, metadata_offsets)
+    (folder / PARENT_METADATA_FILE).write_text(json.dumps(parents, default=str, separators=(",", ":")), encoding="utf-8")
+    encoded = [f"{doc_id}\n".encode("utf-8") for doc_id in ids]
+    with open(folder / IDS_FILE, "wb") as f:
+        f.writelines(encoded)
+    np.save(folder / ID_OFFSETS_FILE, np.concatenate(([0], np.cumsum([len(line) for line in encoded], dtype=np.int64))).astype(np.int64))
+    hashes, order = _id_lookup(ids)
+    np.save(folder / ID_HASHES_FILE, hashes)
+    np.save(folder / ID_ORDER_FILE, order)
+
+def load_columnar(folder: Union[str, Path], embedding_model, use_mmap: bool = True) -> FAISS:
+    folder = Path(folder)
+    index_path = str(folder / INDEX_FILE)
+    index = None
+    if use_mmap:
+        try:
+            index = faiss.read_index(index_path, MMAP_FLAGS)
+        except RuntimeError:
+            index = None
+    if index is None:
+        index = faiss.read_index(index_path)
+    docstore = ColumnarDocstore(folder)
+    return FAISS(
+        embedding_function=embedding_model,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=IndexToDocstoreId(docstore._ids)
+    )
+
+def is_columnar(folder: Union[str, Path]) -> bool:
+    return (Path(folder) / IDS_FILE).exists() and (Path(folder) / INDEX_FILE).exists()
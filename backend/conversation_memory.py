@@ -0,0 +1,116 @@
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List
+from pydantic import Field, PrivateAttr
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.memory import BaseMemory
+from langchain_core.messages import BaseMessage, SystemMessage, get_buffer_string
+from backend.token_budget import estimate_tokens
+from backend.metrics import get_metrics
+from backend.logging import get_logger
+
+MEMORY_MODES = ("buffer", "summary")
+DEFAULT_MEMORY_TOKENS = 1000
+MIN_STANDALONE_WORDS = 4
+
+_FOLLOW_UP_PREFIX = re.compile(r"^\s*(and|but|also|so|or|then|what about|how about|why not|what if|same)\b", re.IGNORECASE)
+_FOLLOW_UP_WORDS = re.compile(
+    r"\b(it|its|it's|they|them|their|theirs|this|these|those|he|she|him|her|his|former|latter|previous|earlier|above|again|else)\b",
+    re.IGNORECASE
+)
+
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+
+def depends_on_history(question: str) -> bool:
+    if len(question.split()) < MIN_STANDALONE_WORDS:
+        return True
+    return bool(_FOLLOW_UP_PREFIX.match(question) or _FOLLOW_UP_WORDS.search(question))
+
+def _message_tokens(messages: List[BaseMessage]) -> int:
+    return sum(estimate_tokens(message.content) for message in messages)
+
+class SummarizingMemory(BaseMemory):
+    llm: Any
+    max_token_limit: int = DEFAULT_MEMORY_TOKENS
+    memory_key: str = "chat_history"
+    input_key: str = "question"
+    output_key: str = "answer"
+    chat_memory: InMemoryChatMessageHistory = Field(default_factory=InMemoryChatMessageHistory)
+    summary: str = ""
+    _pending: List[BaseMessage] = PrivateAttr(default_factory=list)
+    _summarizing: bool = PrivateAttr(default=False)
+    _future: Future = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _logger: Any = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any):
+        self._logger = get_logger(self.__class__.__name__)
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        with self._lock:
+            history = [SystemMessage(content=f"Summary of the earlier conversation: {self.summary}")] if self.summary else []
+            return history + self._pending + list(self.chat_memory.messages)
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return {self.memory_key: self.messages}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]):
+        self.chat_memory.add_user_message(inputs[self.input_key])
+        self.chat_memory.add_ai_message(outputs[self.output_key])
+        self.prune()
+
+    def set_max_token_limit(self, max_token_limit: int):
+        self.max_token_limit = max_token_limit
+        self.prune()
+
+    def prune(self):
+        with self._lock:
+            messages = list(self.chat_memory.messages)
+            evicted = []
+            while len(messages) > 2 and _message_tokens(messages) > self.max_token_limit:
+                evicted.extend(messages[:2])
+                messages = messages[2:]
+            if not evicted:
+                return
+            self.chat_memory.messages = messages
+            self._pending.extend(evicted)
+            self._logger.info(f"Moved {len(evicted) // 2} turns out of the memory window for summarization.")
+            if not self._summarizing:
+                self._summarizing = True
+                self._future = _summary_executor.submit(self._summarize)
+
+    def _summarize(self):
+        from langchain.memory.prompt import SUMMARY_PROMPT
+        while True:
+            with self._lock:
+                batch, summary = list(self._pending), self.summary
+                if not batch:
+                    self._summarizing = False
+                    return
+            try:
+                with get_metrics().span("summarize"):
+                    response = (SUMMARY_PROMPT | self.llm).invoke({"summary": summary, "new_lines": get_buffer_string(batch)})
+            except Exception as e:
+                self._logger.warning(f"Conversation summary failed, keeping {len(batch)} messages verbatim: {e}")
+                with self._lock:
+                    self._summarizing = False
+                return
+            with self._lock:
+                self.summary = (response.content if hasattr(response, "content") else str(response)).strip()
+                del self._pending[:len(batch)]
+
+    def wait(self, timeout: float = None):
+        if self._future is not None:
+            self._future.result(timeout)
+
+    def clear(self):
+        with self._lock:
+            self.chat_memory.clear()
+            self._pending.clear()
+            self.summary = ""
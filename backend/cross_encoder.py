@@ -0,0 +1,54 @@
+import time
+import threading
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple
+from backend.metrics import get_metrics
+from backend.logging import get_logger
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder
+
+DEFAULT_CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+DEFAULT_BATCH_SIZE = 32
+
+_models: Dict[str, "CrossEncoder"] = {}
+_models_lock = threading.Lock()
+
+def load_cross_encoder(model_name: str = DEFAULT_CROSS_ENCODER_MODEL) -> "CrossEncoder":
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+    with _models_lock:
+        model = _models.get(model_name)
+        if model is None:
+            logger = get_logger("CrossEncoderLoader")
+            logger.info(f"Loading CrossEncoder model: {model_name}")
+            start = time.perf_counter()
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(model_name)
+            _models[model_name] = model
+            seconds = time.perf_counter() - start
+            get_metrics().observe_stage("model_load", seconds, model=model_name)
+            logger.info(f"CrossEncoder model loaded in {seconds:.2f}s: {model_name}")
+    return model
+
+class CrossEncoderScorer:
+    def __init__(self, model_name: str = DEFAULT_CROSS_ENCODER_MODEL, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.logger = get_logger(self.__class__.__name__)
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+    def load(self) -> "CrossEncoder":
+        return load_cross_encoder(self.model_name)
+
+    @property
+    def model(self) -> "CrossEncoder":
+        return self.load()
+
+    def score_pairs(self, pairs: Sequence[Tuple[str, str]]) -> List[float]:
+        if not pairs:
+            return []
+        scores = self.model.predict(list(pairs), batch_size=self.batch_size, show_progress_bar=False)
+        return [float(score) for score in scores]
+
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        return self.score_pairs([(query, text) for text in texts])
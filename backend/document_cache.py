@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, List, Optional, Sequence
+from langchain.schema import Document
+from backend.chunking import ChunkRecord, to_documents
+from backend.logging import get_logger
+
+DEFAULT_MAX_CACHE_BYTES = 2 * 1024 ** 3
+
+def url_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+class DocumentCache:
+    def __init__(self, folder: str = "documents/cache", max_bytes: int = DEFAULT_MAX_CACHE_BYTES):
+        self.logger = get_logger(self.__class__.__name__)
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.blob_folder = os.path.join(folder, "blobs")
+        self.chunk_folder = os.path.join(folder, "chunks")
+        self.index_path = os.path.join(folder, "index.json")
+        self._lock = threading.RLock()
+        os.makedirs(self.blob_folder, exist_ok=True)
+        os.makedirs(self.chunk_folder, exist_ok=True)
+        self._index = self._load_index()
+
+    def _load_index(self) -> Dict[str, Dict]:
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                index.setdefault("urls", {})
+                index.setdefault("blobs", {})
+                return index
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Document cache index is unreadable, starting empty: {e}")
+        return {"urls": {}, "blobs": {}}
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.blob_folder, f"{content_hash}.pdf")
+
+    def _chunks_path(self, content_hash: str, variant: str) -> str:
+        return os.path.join(self.chunk_folder, f"{content_hash}_{variant}.json")
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._index["urls"].get(url_key(url))
+            if entry and os.path.exists(self.blob_path(entry["sha256"])):
+                return dict(entry)
+            return None
+
+    def touch(self, content_hash: str):
+        with self._lock:
+            blob = self._index["blobs"].get(content_hash)
+            if blob is not None:
+                blob["last_access"] = time.time()
+                self._save_index()
+
+    def store_blob(self, url: str, tmp_path: str, content_hash: str, etag: str = None, last_modified: str = None) -> str:
+        path = self.blob_path(content_hash)
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+            self._index["blobs"][content_hash] = {
+                "size": os.path.getsize(path),
+                "last_access": time.time()
+            }
+            self._index["urls"][url_key(url)] = {
+                "url": url,
+                "sha256": content_hash,
+                "etag": etag,
+                "last_modified": last_modified
+            }
+            self._save_index()
+        return path
+
+    def load_chunks(self, content_hash: str, variant: str) -> Optional[List[Document]]:
+        path = self._chunks_path(content_hash, variant)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            records = [ChunkRecord(*record) for record in data["chunks"]]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.warning(f"Ignoring unreadable chunk cache {path}: {e}")
+            return None
+        self.touch(content_hash)
+        return to_documents(records, data["parent_id"], data["source"])
+
+    def save_chunks(self, content_hash: str, variant: str, parent_id: str, source: str, records: Sequence[ChunkRecord]):
+        path = self._chunks_path(content_hash, variant)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"parent_id": parent_id, "source": source, "chunks": [list(record) for record in records]}, f)
+        os.replace(tmp_path, path)
+
+    def _entry_size(self, content_hash: str) -> int:
+        size = self._index["blobs"][content_hash].get("size", 0)
+        prefix = f"{content_hash}_"
+        for name in os.listdir(self.chunk_folder):
+            if name.startswith(prefix):
+                size += os.path.getsize(os.path.join(self.chunk_folder, name))
+        return size
+
+    def _evict(self, content_hash: str):
+        blob_path = self.blob_path(content_hash)
+        if os.path.exists(blob_path):
+            os.remove(blob_path)
+        prefix = f"{content_hash}_"
+        for name in os.listdir(self.chunk_folder):
+            if name.startswith(prefix):
+                os.remove(os.path.join(self.chunk_folder, name))
+        self._index["blobs"].pop(content_hash, None)
+        self._index["urls"] = {k: v for k, v in self._index["urls"].items() if v["sha256"] != content_hash}
+
+    def enforce_limit(self):
+        with self._lock:
+            sizes = {h: self._entry_size(h) for h in self._index["blobs"]}
+            total = sum(sizes.values())
+            if total <= self.max_bytes:
+                return
+            by_age = sorted(self._index["blobs"], key=lambda h: self._index["blobs"][h].get("last_access", 0))
+            for content_hash in by_age:
+                if total <= self.max_bytes:
+                    break
+                self.logger.info(f"Evicting cached document {content_hash} ({sizes[content_hash]} bytes).")
+                self._evict(content_hash)
+                total -= sizes[content_hash]
+            self._save_index()
@@ -1,85 +1,206 @@
-
 import os
+import time
+import hashlib
+import threading
 import requests
-from typing import List, Union
-from pathlib import Path
-from typing import List
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from typing import Callable, Dict, List, Optional, Tuple, Union
 from langchain.schema import Document
 from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from backend.chunking import ChunkRecord, ChunkingOptions, Page, chunk_pages, chunk_sources, to_documents
+from backend.document_cache import DocumentCache, DEFAULT_MAX_CACHE_BYTES, url_key
+from backend.metrics import get_metrics
 from backend.logging import get_logger
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+ProgressCallback = Callable[[str, str, int, int], None]
+
+def _get_filename(path):
+    if not path or path == "unknown":
+        return "unknown_document"
+    return os.path.basename(path).split('.')[0]
+
+def legacy_parent_id(url: str) -> str:
+    return _get_filename(url.split('?')[0])
+
+def _parent_id(url: str, content_hash: str) -> str:
+    return f"{legacy_parent_id(url)}_{content_hash[:12]}"
+
+def _pages(docs: List[Document]) -> List[Page]:
+    return [(doc.metadata.get("page", 0), doc.page_content) for doc in docs]
+
+def _load_and_chunk_pdf(pdf_path: str, parent_id: str, options: ChunkingOptions) -> Tuple[List[ChunkRecord], Dict[str, float]]:
+    start = time.perf_counter()
+    pages = _pages(PyPDFLoader(pdf_path).load())
+    parsed = time.perf_counter()
+    records = chunk_pages(pages, parent_id, options)
+    return records, {"parse": parsed - start, "chunk": time.perf_counter() - parsed}
+
 class DocumentHandler:
-    def __init__(self, folder: str = "documents"):
+    def __init__(self, folder: str = "documents", max_download_workers: int = 8, max_parse_workers: int = None,
+                 max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES, chunk_unit: str = "chars", respect_pages: bool = True):
         self.logger = get_logger(self.__class__.__name__)
+        self.metrics = get_metrics()
         self.folder = folder
+        self.cache = DocumentCache(os.path.join(folder, "cache"), max_bytes=max_cache_bytes)
+        self.max_download_workers = max_download_workers
+        self.max_parse_workers = max_parse_workers or min(4, os.cpu_count() or 1)
+        self.chunk_unit = chunk_unit
+        self.respect_pages = respect_pages
+        self._session_local = threading.local()
         os.makedirs(self.folder, exist_ok=True)
         self.logger.info(f"DocumentHandler initialized with folder: {self.folder}")
 
-    def _download_pdf(self, url: str) -> tuple[str, bool]:
-        filename = os.path.basename(url.split('?')[0])
-        filepath = os.path.join(self.folder, filename)
-        if os.path.exists(filepath):
-            self.logger.info(f"PDF already exists: {filepath}, skipping download.")
-            return filepath, False
-        self.logger.info(f"Downloading PDF from {url} to {filepath}.")
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        with open(filepath, 'wb') as f:
-            f.write(response.content)
+    def _get_session(self) -> requests.Session:
+        session = getattr(self._session_local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.max_download_workers, pool_maxsize=self.max_download_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session_local.session = session
+        return session
+
+    def _download_pdf(self, url: str) -> tuple[str, str]:
+        with self.metrics.span("download"):
+            return self._fetch_pdf(url)
+
+    def _fetch_pdf(self, url: str) -> tuple[str, str]:
+        cached = self.cache.lookup(url)
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        self.logger.info(f"Fetching PDF from {url}.")
+        tmp_path = os.path.join(self.cache.blob_folder, f"{url_key(url)[:16]}.{threading.get_ident()}.part")
+        try:
+            with self._get_session().get(url, timeout=10, stream=True, headers=headers) as response:
+                if cached and response.status_code == 304:
+                    self.logger.info(f"PDF not modified, using cached copy: {url}")
+                    self.cache.touch(cached["sha256"])
+                    return self.cache.blob_path(cached["sha256"]), cached["sha256"]
+                response.raise_for_status()
+                sha256 = hashlib.sha256()
+                with open(tmp_path, 'wb') as f:
+                    for block in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        sha256.update(block)
+                        f.write(block)
+                content_hash = sha256.hexdigest()
+                filepath = self.cache.store_blob(
+                    url, tmp_path, content_hash,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified")
+                )
+        except requests.RequestException as e:
+            if cached:
+                self.logger.warning(f"Could not revalidate {url}, using cached copy: {e}")
+                self.cache.touch(cached["sha256"])
+                return self.cache.blob_path(cached["sha256"]), cached["sha256"]
+            raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
         self.logger.info(f"Downloaded PDF to {filepath}.")
-        return filepath, True
+        return filepath, content_hash
+
+    def _report_progress(self, progress_callback: Optional[ProgressCallback], stage: str, url: str, completed: int, total: int):
+        if progress_callback is None:
+            return
+        try:
+            progress_callback(stage, url, completed, total)
+        except Exception as e:
+            self.logger.warning(f"Progress callback failed: {e}")
+
+    def _download_all(self, urls: List[str], progress_callback: Optional[ProgressCallback], failures: Dict[str, str]) -> Dict[str, tuple[str, str]]:
+        pdf_paths = {}
+        workers = max(1, min(self.max_download_workers, len(urls)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self._download_pdf, url): url for url in urls}
+            for completed, future in enumerate(as_completed(futures), start=1):
+                url = futures[future]
+                try:
+                    pdf_paths[url] = future.result()
+                    self._report_progress(progress_callback, "downloaded", url, completed, len(urls))
+                except Exception as e:
+                    self.logger.warning(f"Skipping document {url} due to download error: {e}")
+                    failures[url] = str(e)
+                    self._report_progress(progress_callback, "failed", url, completed, len(urls))
+        return pdf_paths
+
+    def _parse_all(self, pdf_paths: Dict[str, tuple[str, str]], options: ChunkingOptions, progress_callback: Optional[ProgressCallback],
+                   failures: Dict[str, str]) -> List[Document]:
+        all_chunks = []
+        seen = {}
+        to_parse = {}
+        for url, (pdf_path, content_hash) in pdf_paths.items():
+            if content_hash in seen:
+                self.logger.info(f"{url} has the same content as {seen[content_hash]}, skipping.")
+                continue
+            seen[content_hash] = url
+            cached_chunks = self.cache.load_chunks(content_hash, options.cache_variant)
+            if cached_chunks is not None:
+                self.logger.info(f"Reusing {len(cached_chunks)} cached chunks for {url}.")
+                self.metrics.inc("rag_document_chunk_cache_total", result="hit")
+                all_chunks.extend(cached_chunks)
+            else:
+                to_parse[content_hash] = (url, pdf_path)
+
+        if not to_parse:
+            return all_chunks
+        workers = max(1, min(self.max_parse_workers, len(to_parse)))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_load_and_chunk_pdf, pdf_path, _parent_id(url, content_hash), options): (url, content_hash)
+                for content_hash, (url, pdf_path) in to_parse.items()
+            }
+            for completed, future in enumerate(as_completed(futures), start=1):
+                url, content_hash = futures[future]
+                try:
+                    records, timings = future.result()
+                    for stage, seconds in timings.items():
+                        self.metrics.observe_stage(stage, seconds)
+                    self.metrics.inc("rag_document_chunk_cache_total", result="miss")
+                    parent_id = _parent_id(url, content_hash)
+                    self.cache.save_chunks(content_hash, options.cache_variant, parent_id, url, records)
+                    all_chunks.extend(to_documents(records, parent_id, url))
+                    self._report_progress(progress_callback, "parsed", url, completed, len(to_parse))
+                except Exception as e:
+                    self.logger.warning(f"Skipping document {url} due to parse error: {e}")
+                    failures[url] = str(e)
+                    self._report_progress(progress_callback, "failed", url, completed, len(to_parse))
+        return all_chunks
 
-    def load_and_chunk_pdfs(self, documents: Union[List[str], List[Document]], chunk_size: int = 800, chunk_overlap: int = 80) -> List[Document]:
+    def load_and_chunk_pdfs(self, documents: Union[List[str], List[Document]], chunk_size: int = 800, chunk_overlap: int = 80,
+                            progress_callback: Optional[ProgressCallback] = None, failures: Dict[str, str] = None) -> List[Document]:
             self.logger.info("Starting PDF loading and chunking.")
             if isinstance(chunk_size, str):
                 chunk_size = int(chunk_size)
             if isinstance(chunk_overlap, str):
                 chunk_overlap = int(chunk_overlap)
+            failures = {} if failures is None else failures
+            options = ChunkingOptions(chunk_size, chunk_overlap, self.chunk_unit, self.respect_pages)
 
             if documents and isinstance(documents[0], str):
-                loaded_docs = []
-                for url in documents:
-                    try:
-                        pdf_path, downloaded = self._download_pdf(url)
-                        if downloaded:
-                            pdf_docs = PyPDFLoader(pdf_path).load()
-                            loaded_docs.extend(pdf_docs)
-                    except Exception as e:
-                        self.logger.warning(f"Skipping document due to error: {e}")
-                documents = loaded_docs
-
-            def get_filename(path):
-                if not path or path == "unknown":
-                    return "unknown_document"
-                return os.path.basename(path).split('.')[0]
+                pdf_paths = self._download_all(documents, progress_callback, failures)
+                all_chunks = self._parse_all(pdf_paths, options, progress_callback, failures)
+                self.cache.enforce_limit()
+                if failures:
+                    self.logger.warning(f"Failed to ingest {len(failures)} of {len(documents)} URLs.")
+                self.logger.info(f"Generated {len(all_chunks)} chunks from documents.")
+                return all_chunks
 
             source_groups = {}
             for doc in documents:
                 source = doc.metadata.get("source", "unknown")
                 source_groups.setdefault(source, []).append(doc)
 
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap
-            )
-
-            all_chunks = []
-            for source, docs in source_groups.items():
-                docs.sort(key=lambda x: x.metadata.get("page", 0))
-                parent_id = get_filename(source)
-                chunks = splitter.split_documents(docs)
-
-                for i, chunk in enumerate(chunks):
-                    page_num = chunk.metadata.get("page", 0)
-                    chunk_id = f"{parent_id}_p{page_num}_c{i}"
-                    chunk.metadata.update({
-                        "parent_id": parent_id,
-                        "parent_source": source,
-                        "chunk_id": chunk_id,
-                        "chunk_index": i,
-                        "total_chunks": len(chunks)
-                    })
-                    all_chunks.append(chunk)
+            sources = {source: (_get_filename(source), _pages(docs)) for source, docs in source_groups.items()}
+            with self.metrics.span("chunk"):
+                all_chunks = chunk_sources(sources, options, max_workers=self.max_parse_workers)
             self.logger.info(f"Generated {len(all_chunks)} chunks from documents.")
             return all_chunks
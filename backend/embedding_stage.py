@@ -0,0 +1,174 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Sequence
+from langchain_core.embeddings import Embeddings
+from backend.metrics import get_metrics
+from backend.resource_registry import file_lock
+from backend.logging import get_logger
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def embedding_model_name(embeddings: Embeddings) -> str:
+    for attr in ("model", "model_name"):
+        value = getattr(embeddings, attr, None)
+        if isinstance(value, str) and value:
+            return value
+    return embeddings.__class__.__name__
+
+class EmbeddingCache:
+    def __init__(self, folder: str, model_name: str):
+        self.logger = get_logger(self.__class__.__name__)
+        self.folder = os.path.join(folder, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self.keys_path = os.path.join(self.folder, "keys.txt")
+        self.vectors_path = os.path.join(self.folder, "vectors.f32")
+        self.meta_path = os.path.join(self.folder, "meta.json")
+        self.lock_path = os.path.join(self.folder, ".lock")
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._rows: Dict[str, int] = {}
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        os.makedirs(self.folder, exist_ok=True)
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with file_lock(self.lock_path):
+                self._load()
+            self._loaded = True
+            self.logger.info(f"Mapped {len(self._rows)} cached embeddings from {self.folder}.")
+
+    def _load(self):
+        if not all(os.path.exists(p) for p in (self.keys_path, self.vectors_path, self.meta_path)):
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            dim = json.load(f)["dim"]
+        with open(self.keys_path, "r", encoding="ascii") as f:
+            keys = [line.rstrip("\n") for line in f if line.endswith("\n")]
+        size = os.path.getsize(self.vectors_path) // 4
+        rows = min(len(keys), size // dim)
+        if rows < len(keys) or size != rows * dim:
+            self.logger.warning(f"Embedding cache {self.folder} is inconsistent, keeping {rows} of {len(keys)} rows.")
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(rows * dim * 4)
+            with open(self.keys_path, "w", encoding="ascii") as f:
+                f.write("".join(f"{key}\n" for key in keys[:rows]))
+        if rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, dim))
+        self._rows = {key: row for row, key in enumerate(keys[:rows])}
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._rows)
+
+    def get(self, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            self._ensure_loaded()
+            for h in hashes:
+                if h in self._rows:
+                    found[h] = self._matrix[self._rows[h]]
+        return found
+
+    def put(self, hashes: Sequence[str], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._ensure_loaded()
+            with file_lock(self.lock_path):
+                if not os.path.exists(self.meta_path):
+                    with open(self.meta_path, "w", encoding="utf-8") as f:
+                        json.dump({"dim": int(vectors.shape[1])}, f)
+                with open(self.vectors_path, "ab") as f:
+                    vectors.tofile(f)
+                with open(self.keys_path, "a", encoding="ascii") as f:
+                    f.write("".join(f"{h}\n" for h in hashes))
+                self._load()
+
+class LazyEmbeddings(Embeddings):
+    def __init__(self, factory: Callable[[], Embeddings], model: str):
+        self.logger = get_logger(self.__class__.__name__)
+        self.factory = factory
+        self.model = model
+        self._embeddings: Embeddings = None
+        self._lock = threading.Lock()
+
+    def load(self) -> Embeddings:
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    start = time.perf_counter()
+                    self._embeddings = self.factory()
+                    self.logger.info(f"Loaded embedding client for {self.model} in {time.perf_counter() - start:.2f}s.")
+        return self._embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.load().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.load().embed_query(text)
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, cache_folder: str = "embedding_cache", batch_size: int = 256,
+                 max_concurrency: int = 4, max_retries: int = 5, backoff_seconds: float = 1.0):
+        self.logger = get_logger(self.__class__.__name__)
+        self.metrics = get_metrics()
+        self.embeddings = embeddings
+        self.model_name = embedding_model_name(embeddings)
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.cache = EmbeddingCache(cache_folder, self.model_name) if cache_folder else None
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random() * 0.25)
+                self.logger.warning(f"Embedding batch of {len(texts)} failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        hashes = [text_hash(text) for text in texts]
+        vectors = self.cache.get(hashes) if self.cache is not None else {}
+
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in vectors and h not in missing:
+                missing[h] = text
+        self.logger.info(f"Embedding {len(missing)} of {len(texts)} texts ({len(texts) - len(missing)} cached) with {self.model_name}.")
+        self.metrics.inc("rag_embedding_texts_total", len(texts) - len(missing), result="cached")
+        self.metrics.inc("rag_embedding_texts_total", len(missing), result="embedded")
+
+        if missing:
+            missing_hashes = list(missing.keys())
+            batches = [missing_hashes[i:i + self.batch_size] for i in range(0, len(missing_hashes), self.batch_size)]
+            with self.metrics.span("embed"), ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrency, len(batches)))) as executor:
+                futures = {executor.submit(self._embed_batch, [missing[h] for h in batch]): batch for batch in batches}
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    batch_vectors = future.result()
+                    if self.cache is not None:
+                        self.cache.put(batch, batch_vectors)
+                    vectors.update(zip(batch, batch_vectors))
+
+        return [vectors[h].tolist() for h in hashes]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        return [vector.tolist() for batch in batches for vector in self._embed_batch(batch)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,168 @@
+import re
+import math
+import numpy as np
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple, Union
+
+LEXICAL_FILE = "bm25.npz"
+LEXICAL_PREFIX = "bm25_"
+LEXICAL_ARRAYS = ("ids", "lengths", "offsets", "rows", "tfs")
+
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-'’]\w+)*")
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if "-" in token or "'" in token or "’" in token:
+            tokens.extend(re.split(r"[-'’]", token))
+    return tokens
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._base_ids = np.empty(0, dtype=str)
+        self._base_lengths = np.empty(0, dtype=np.int32)
+        self._terms: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._rows = np.empty(0, dtype=np.int32)
+        self._tfs = np.empty(0, dtype=np.int32)
+        self._ids: List[str] = []
+        self._lengths = array("i")
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._total_length = 0
+
+    @classmethod
+    def from_texts(cls, ids: Sequence[str], texts: Sequence[str], **kwargs) -> "BM25Index":
+        index = cls(**kwargs)
+        index.add(ids, texts)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._base_ids) + len(self._ids)
+
+    def _doc_id(self, row: int) -> str:
+        if row < len(self._base_ids):
+            return str(self._base_ids[row])
+        return self._ids[row - len(self._base_ids)]
+
+    def _all_ids(self) -> List[str]:
+        return self._base_ids.tolist() + self._ids
+
+    def _all_lengths(self) -> np.ndarray:
+        return np.concatenate((self._base_lengths, np.frombuffer(self._lengths, dtype=np.int32)))
+
+    def _posting(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        rows, tfs = [], []
+        i = self._terms.get(term)
+        if i is not None:
+            rows.append(self._rows[self._offsets[i]:self._offsets[i + 1]])
+            tfs.append(self._tfs[self._offsets[i]:self._offsets[i + 1]])
+        added = self._postings.get(term)
+        if added is not None:
+            rows.append(np.frombuffer(added[0], dtype=np.int32))
+            tfs.append(np.frombuffer(added[1], dtype=np.int32))
+        if not rows:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        if len(rows) == 1:
+            return rows[0], tfs[0]
+        return np.concatenate(rows), np.concatenate(tfs)
+
+    def _all_terms(self) -> List[str]:
+        return list(self._terms) + [term for term in self._postings if term not in self._terms]
+
+    def _add_counts(self, doc_id: str, counts: Dict[str, int]):
+        row = len(self)
+        self._ids.append(doc_id)
+        length = sum(counts.values())
+        self._lengths.append(length)
+        self._total_length += length
+        for term, tf in counts.items():
+            rows, tfs = self._postings.setdefault(term, (array("i"), array("i")))
+            rows.append(row)
+            tfs.append(tf)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]):
+        for doc_id, text in zip(ids, texts):
+            self._add_counts(doc_id, Counter(tokenize(text)))
+
+    def merge(self, other: "BM25Index"):
+        offset = len(self)
+        self._ids.extend(other._all_ids())
+        self._lengths.extend(other._all_lengths().tolist())
+        self._total_length += other._total_length
+        for term in other._all_terms():
+            rows, tfs = other._posting(term)
+            own_rows, own_tfs = self._postings.setdefault(term, (array("i"), array("i")))
+            own_rows.extend((rows + offset).tolist())
+            own_tfs.extend(tfs.tolist())
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        count = len(self)
+        if not count or k <= 0:
+            return []
+        lengths = self._all_lengths()
+        avg_length = self._total_length / count or 1.0
+        norms = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+        scores = np.zeros(count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            rows, tfs = self._posting(term)
+            if len(rows) == 0:
+                continue
+            tfs = tfs.astype(np.float32)
+            idf = math.log(1 + (count - len(rows) + 0.5) / (len(rows) + 0.5))
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norms[rows])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self._doc_id(row), float(scores[row])) for row in matched]
+
+    def save(self, folder: Union[str, Path]):
+        folder = Path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        terms = self._all_terms()
+        postings = [self._posting(term) for term in terms]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, (rows, _) in enumerate(postings):
+            offsets[i + 1] = offsets[i] + len(rows)
+        arrays = {
+            "ids": np.array(self._all_ids(), dtype=str),
+            "lengths": self._all_lengths(),
+            "offsets": offsets,
+            "rows": np.concatenate([rows for rows, _ in postings]) if postings else np.empty(0, dtype=np.int32),
+            "tfs": np.concatenate([tfs for _, tfs in postings]) if postings else np.empty(0, dtype=np.int32)
+        }
+        for name, values in arrays.items():
+            np.save(folder / f"{LEXICAL_PREFIX}{name}.npy", values)
+        tmp_path = folder / f"{LEXICAL_FILE}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, terms=np.array(terms, dtype=str), params=np.array([self.k1, self.b]))
+        tmp_path.replace(folder / LEXICAL_FILE)
+
+    @classmethod
+    def load(cls, folder: Union[str, Path]) -> "BM25Index":
+        folder = Path(folder)
+        with np.load(folder / LEXICAL_FILE) as data:
+            k1, b = data["params"].tolist()
+            index = cls(k1=k1, b=b)
+            terms = data["terms"].tolist()
+            if "rows" in data:
+                arrays = {name: data[name] for name in LEXICAL_ARRAYS}
+            else:
+                arrays = {name: np.load(folder / f"{LEXICAL_PREFIX}{name}.npy", mmap_mode="r") for name in LEXICAL_ARRAYS}
+        index._base_ids = arrays["ids"]
+        index._base_lengths = arrays["lengths"]
+        index._offsets = arrays["offsets"]
+        index._rows = arrays["rows"]
+        index._tfs = arrays["tfs"]
+        index._terms = {term: i for i, term in enumerate(terms)}
+        index._total_length = int(np.sum(index._base_lengths, dtype=np.int64))
+        return index
+
+def has_lexical_index(folder: Union[str, Path]) -> bool:
+    return (Path(folder) / LEXICAL_FILE).exists()
@@ -1,21 +1,58 @@
 import os
+import queue
+import atexit
 import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
 
-LOG_PATH = "logs/app.log"
+LOG_DIR = "logs"
+LOG_PATH = os.path.join(LOG_DIR, "app.log")
+LOG_LEVEL = os.getenv("RAG_LOG_LEVEL", "INFO").upper()
 
-def get_logger(name: str) -> logging.Logger:
-    os.makedirs("logs", exist_ok=True)
-
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+_log_queue = queue.SimpleQueue()
+_listener = None
+_listener_lock = threading.Lock()
 
-    if not logger.hasHandlers():
-        file_handler = logging.FileHandler(LOG_PATH)
-        file_handler.setLevel(logging.INFO)
+def _start_listener():
+    global _listener
+    if _listener is not None:
+        return
+    with _listener_lock:
+        if _listener is not None:
+            return
+        os.makedirs(LOG_DIR, exist_ok=True)
+        file_handler = logging.FileHandler(LOG_PATH, encoding="utf-8")
+        file_handler.setLevel(LOG_LEVEL)
 
         formatter = logging.Formatter('[%(asctime)s] %(levelname)s - %(name)s - %(message)s')
         file_handler.setFormatter(formatter)
 
-        logger.addHandler(file_handler)
+        _listener = QueueListener(_log_queue, file_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+def get_logger(name: str) -> logging.Logger:
+    _start_listener()
+
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+
+    if not logger.hasHandlers():
+        logger.addHandler(QueueHandler(_log_queue))
 
     return logger
+
+def read_log_tail(max_bytes: int = 256 * 1024, offset: int = None) -> tuple[str, int]:
+    if not os.path.exists(LOG_PATH):
+        return "", 0
+    with open(LOG_PATH, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        from_tail = offset is None or offset > size
+        if from_tail:
+            offset = max(0, size - max_bytes)
+        f.seek(offset)
+        data = f.read(size - offset)
+    text = data.decode("utf-8", errors="replace")
+    if from_tail and offset and "\n" in text:
+        text = text.split("\n", 1)[1]
+    return text, size
@@ -0,0 +1,130 @@
+import time
+import json
+import threading
+import numpy as np
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STAGE_METRIC = "rag_stage_duration_seconds"
+RECENT_SAMPLES = 1024
+RECENT_SPANS = 200
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Dict[str, str]) -> LabelSet:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: LabelSet, extra: Dict[str, str] = None) -> str:
+    pairs = list(labels) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def summary(self) -> Dict[str, float]:
+        recent = np.asarray(self.recent, dtype=np.float64)
+        p50, p95, p99 = np.percentile(recent, [50, 95, 99]) if len(recent) else (0.0, 0.0, 0.0)
+        return {"count": self.count, "sum": self.sum, "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+class MetricsRegistry:
+    def __init__(self):
+        self._counters: Dict[Tuple[str, LabelSet], float] = {}
+        self._histograms: Dict[Tuple[str, LabelSet], Histogram] = {}
+        self._spans = deque(maxlen=RECENT_SPANS)
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def observe_stage(self, stage: str, seconds: float, **labels):
+        self.observe(STAGE_METRIC, seconds, stage=stage, **labels)
+        with self._lock:
+            self._spans.append({"stage": stage, "end": time.time(), "seconds": seconds, **labels})
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("rag_stage_errors_total", stage=stage)
+            raise
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start, **labels)
+
+    def recent_spans(self, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            return list(self._spans)[-limit:][::-1]
+
+    def export_json(self) -> Dict:
+        with self._lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self._counters.items()],
+                "histograms": [dict(name=name, labels=dict(labels), **histogram.summary()) for (name, labels), histogram in self._histograms.items()]
+            }
+
+    def export_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (counter, labels), value in self._counters.items():
+                    if counter == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (histogram_name, labels), histogram in self._histograms.items():
+                    if histogram_name != name:
+                        continue
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f"{name}_bucket{_format_labels(labels, {'le': str(bound)})} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, {'le': '+Inf'})} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str, fmt: str = "prometheus"):
+        content = self.export_prometheus() if fmt == "prometheus" else json.dumps(self.export_json(), indent=2)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._spans.clear()
+
+_metrics = MetricsRegistry()
+
+def get_metrics() -> MetricsRegistry:
+    return _metrics
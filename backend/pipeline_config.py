@@ -0,0 +1,47 @@
+from dataclasses import dataclass, fields
+from typing import Optional, Set, Tuple
+from backend.cross_encoder import DEFAULT_CROSS_ENCODER_MODEL, DEFAULT_BATCH_SIZE
+from backend.reranker import AGGREGATIONS, RERANK_MODES
+
+RETRIEVAL_MODES = ("dense", "hybrid")
+RETRIEVER_FIELDS = ("retrieval_mode", "use_reranking", "rerank_mode", "rerank_aggregation", "rerank_top_n", "rerank_window", "retriever_k", "top_k_chunks", "cross_encoder_model", "cross_encoder_batch_size")
+CHAIN_FIELDS = ("prompt_type", "additional_instruction", "rewrite", "rewrite_fusion", "context_token_budget", "answer_cache", "semantic_cache_threshold")
+
+@dataclass(frozen=True)
+class PipelineConfig:
+    prompt_type: str = "zero_shot"
+    additional_instruction: Optional[str] = None
+    rewrite: bool = False
+    rewrite_fusion: bool = False
+    context_token_budget: Optional[int] = None
+    retrieval_mode: str = "dense"
+    use_reranking: bool = False
+    rerank_mode: str = "parent"
+    rerank_aggregation: str = "max"
+    rerank_top_n: int = 2
+    rerank_window: int = 2
+    retriever_k: int = 4
+    top_k_chunks: int = 20
+    cross_encoder_model: str = DEFAULT_CROSS_ENCODER_MODEL
+    cross_encoder_batch_size: int = DEFAULT_BATCH_SIZE
+    answer_cache: bool = True
+    semantic_cache_threshold: Optional[float] = None
+
+    def __post_init__(self):
+        if self.retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {self.retrieval_mode}. Expected one of {RETRIEVAL_MODES}.")
+        if self.rerank_mode not in RERANK_MODES:
+            raise ValueError(f"Unknown rerank mode: {self.rerank_mode}. Expected one of {RERANK_MODES}.")
+        if self.rerank_aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown score aggregation: {self.rerank_aggregation}. Expected one of {AGGREGATIONS}.")
+
+    def diff(self, other: "PipelineConfig") -> Set[str]:
+        return {f.name for f in fields(self) if getattr(self, f.name) != getattr(other, f.name)}
+
+    @property
+    def retriever_key(self) -> Tuple:
+        return tuple(getattr(self, name) for name in RETRIEVER_FIELDS)
+
+    @property
+    def chain_key(self) -> Tuple:
+        return tuple(getattr(self, name) for name in CHAIN_FIELDS)
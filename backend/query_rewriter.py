@@ -0,0 +1,68 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from langchain_core.documents import Document
+from backend.answer_cache import normalize_question
+from backend.logging import get_logger
+
+class QueryRewriter:
+    def __init__(self, llm, prompt_manager, vectorstore_manager, context_k: int = 3, max_entries: int = 256):
+        self.logger = get_logger(self.__class__.__name__)
+        self.llm = llm
+        self.prompt_manager = prompt_manager
+        self.vectorstore_manager = vectorstore_manager
+        self.context_k = context_k
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0}
+
+    def _key(self, question: str) -> Tuple:
+        return (normalize_question(question), self.vectorstore_manager.version)
+
+    def _cached(self, key: Tuple) -> Optional[str]:
+        with self._lock:
+            rewritten = self._cache.get(key)
+            if rewritten is None:
+                self.metrics["misses"] += 1
+                return None
+            self.metrics["hits"] += 1
+            self._cache.move_to_end(key)
+        self.logger.info(f"Rewrite cache hit: {rewritten}")
+        return rewritten
+
+    def _store(self, key: Tuple, question: str, rewritten: str) -> str:
+        rewritten = rewritten.strip() or question
+        with self._lock:
+            self._cache[key] = rewritten
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        self.logger.info(f"Rewritten query: {rewritten}")
+        return rewritten
+
+    def _context(self, question: str) -> List[Document]:
+        vectorstore = self.vectorstore_manager.vectorstore
+        if vectorstore is None or self.context_k <= 0:
+            return []
+        with self.vectorstore_manager.lock.read():
+            return vectorstore.similarity_search(question, k=self.context_k)
+
+    async def _acontext(self, question: str) -> List[Document]:
+        return await asyncio.to_thread(self._context, question)
+
+    def rewrite(self, question: str) -> str:
+        key = self._key(question)
+        rewritten = self._cached(key)
+        if rewritten is None:
+            rewritten = self._store(key, question, self.prompt_manager.rewrite_query(question, self.llm, self._context(question)))
+        return rewritten
+
+    async def arewrite(self, question: str) -> str:
+        key = self._key(question)
+        rewritten = self._cached(key)
+        if rewritten is None:
+            context_docs = await self._acontext(question)
+            rewritten = self._store(key, question, await self.prompt_manager.arewrite_query(question, self.llm, context_docs))
+        return rewritten
@@ -1,120 +1,561 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
 import os
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationalRetrievalChain
-from langchain_openai import OpenAIEmbeddings
-from langchain_google_genai import GoogleGenerativeAI
-from langchain_openai import ChatOpenAI
-from backend.document_handler import DocumentHandler
+import threading
+from dataclasses import replace
+from typing import AsyncIterator, Dict, Iterator, List
+from langchain_core.messages import get_buffer_string
+from backend.document_handler import DocumentHandler, legacy_parent_id
 from backend.vectorstore_manager import VectorstoreManager
+from backend.embedding_stage import CachedEmbeddings, LazyEmbeddings
 from prompts.prompt_manager import PromptManager
 from backend.reranker import create_parent_document_llm_reranker
+from backend.cross_encoder import CrossEncoderScorer, DEFAULT_CROSS_ENCODER_MODEL, DEFAULT_BATCH_SIZE
+from backend.resource_registry import ResourceRegistry, get_registry
+from backend.retrievers import HybridRetriever, LockedRetriever, hybrid_search_by_vectors, reciprocal_rank_fusion, similarity_search_by_vectors
+from backend.query_rewriter import QueryRewriter
+from backend.pipeline_config import PipelineConfig, RETRIEVER_FIELDS
+from backend.token_budget import fit_token_budget
+from backend.answer_cache import AnswerCache, CachedAnswer, normalize_question
+from backend.conversation_memory import DEFAULT_MEMORY_TOKENS, MEMORY_MODES, SummarizingMemory, depends_on_history
+from backend.metrics import get_metrics
 from backend.logging import get_logger
-from sentence_transformers import CrossEncoder
 from langchain.prompts import PromptTemplate
 
+MAX_CACHED_CHAINS = 8
+EMBEDDING_MODEL = "text-embedding-ada-002"
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+get_metrics().observe_stage("import", IMPORT_SECONDS, module=__name__)
+
+def _message_text(message) -> str:
+    return message.content if hasattr(message, "content") else str(message)
+
+def _condense_prompt() -> PromptTemplate:
+    from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+    return CONDENSE_QUESTION_PROMPT
+
 class RAGPipeline:
-    def __init__(self):
+    def __init__(self, index_type: str = "flat", index_params: dict = None, persist_directory: str = "faiss_index",
+                 registry: ResourceRegistry = None, config: PipelineConfig = None):
+        start = time.perf_counter()
         self.logger = get_logger(self.__class__.__name__)
+        self.metrics = get_metrics()
         self.logger.info("================================================================")
         self.logger.info("STARTING RAG PIPELINE")
         self.logger.info("================================================================")
         self.logger.info("Initializing RAGPipeline...")
-        self.embedding_model = OpenAIEmbeddings(model="text-embedding-ada-002")
-        self.llm = self._load_llm()
-        self.vectorstore = None
-        self.doc_handler = DocumentHandler()
+        self.resources = registry or get_registry()
+        self.embedding_model = self.resources.get("embedding_model", lambda: CachedEmbeddings(LazyEmbeddings(self._load_embeddings, EMBEDDING_MODEL)))
+        self.vectorstore_manager = self.resources.get(
+            ("vectorstore_manager", persist_directory),
+            lambda: VectorstoreManager(self.embedding_model, persist_directory, index_type=index_type, index_params=index_params)
+        )
+        self.doc_handler = self.resources.get("doc_handler", DocumentHandler)
+        self.loaded_urls = self.resources.get(("loaded_urls", persist_directory), set)
+        self.ingest_lock = self.resources.get(("ingest_lock", persist_directory), threading.Lock)
+        self.answer_cache = self.resources.get(("answer_cache", persist_directory), self._create_answer_cache)
         self.prompt_manager = PromptManager()
         self.retriever = None
         self.memory = None
-        self.rewrite = False
-        self.prompt_type = "zero_shot"
-        self.additional_prompt_instruction = None
-        self.use_reranking = False
-        self.retriever_k = 4
-        self.top_k_chunks = 20
-        self.cross_encoder = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-12-v2")
+        self.config = config or PipelineConfig()
+        self.cross_encoder = self._get_cross_encoder(self.config.cross_encoder_model, self.config.cross_encoder_batch_size)
+        self._chains = {}
+        self._prompts = {}
+        self.vectorstore_manager.load()
+        self.startup_seconds = time.perf_counter() - start
+        self.metrics.observe_stage("startup", self.startup_seconds)
+        self.logger.info(f"RAGPipeline ready in {self.startup_seconds:.2f}s (backend imports took {IMPORT_SECONDS:.2f}s).")
+
+    @property
+    def vectorstore(self):
+        return self.vectorstore_manager.vectorstore
+
+    @property
+    def llm(self):
+        return self.resources.get("llm", self._load_llm)
+
+    @property
+    def query_rewriter(self) -> QueryRewriter:
+        return self.resources.get(
+            ("query_rewriter", self.vectorstore_manager.persist_directory),
+            lambda: QueryRewriter(self.llm, self.prompt_manager, self.vectorstore_manager)
+        )
+
+    @property
+    def prompt_type(self) -> str:
+        return self.config.prompt_type
+
+    @property
+    def additional_prompt_instruction(self) -> str:
+        return self.config.additional_instruction
+
+    @property
+    def rewrite(self) -> bool:
+        return self.config.rewrite
+
+    @property
+    def use_reranking(self) -> bool:
+        return self.config.use_reranking
+
+    @property
+    def retriever_k(self) -> int:
+        return self.config.retriever_k
+
+    @property
+    def top_k_chunks(self) -> int:
+        return self.config.top_k_chunks
+
+    def _get_cross_encoder(self, model_name: str, batch_size: int) -> CrossEncoderScorer:
+        return self.resources.get(("cross_encoder", model_name, batch_size), lambda: CrossEncoderScorer(model_name, batch_size))
+
+    def _create_answer_cache(self) -> AnswerCache:
+        cache = AnswerCache()
+        self.vectorstore_manager.add_listener(cache.invalidate)
+        return cache
+
+    def _load_embeddings(self):
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(model=EMBEDDING_MODEL)
 
     def _load_llm(self):
         self.logger.info("Loading LLM...")
         if os.getenv("GEMINI_API_KEY"):
             self.logger.info("Using Gemini model.")
+            from langchain_google_genai import GoogleGenerativeAI
             return GoogleGenerativeAI(api_key=os.getenv("GEMINI_API_KEY"), model="gemini-2.0-flash")
         elif os.getenv("OPENAI_API_KEY"):
             self.logger.info("Using OpenAI model.")
+            from langchain_openai import ChatOpenAI
             return ChatOpenAI(api_key=os.getenv("OPENAI_API_KEY"), model="gpt-4.1-mini", temperature=0.0)
         raise ValueError("Invalid LLM configuration. Please set OPENAI_API_KEY or GEMINI_API_KEY.")
 
+    def warm_up(self, cross_encoder: bool = None, background: bool = False):
+        if background:
+            thread = threading.Thread(target=self._warm_up_in_background, args=(cross_encoder,), name="pipeline-warm-up", daemon=True)
+            thread.start()
+            return thread
+        if cross_encoder is None:
+            cross_encoder = self.use_reranking
+        start = time.perf_counter()
+        with self.metrics.span("warm_up"):
+            self.resources.get("llm", self._load_llm)
+            embeddings = getattr(self.embedding_model, "embeddings", self.embedding_model)
+            if isinstance(embeddings, LazyEmbeddings):
+                embeddings.load()
+            if cross_encoder:
+                self.cross_encoder.load()
+        self.logger.info(f"Warm-up finished in {time.perf_counter() - start:.2f}s (cross-encoder: {cross_encoder}).")
+
+    def _warm_up_in_background(self, cross_encoder: bool):
+        try:
+            self.warm_up(cross_encoder)
+        except Exception as e:
+            self.logger.warning(f"Background warm-up failed, models will load on first use: {e}")
+
+    def _lexical_index(self):
+        return self.vectorstore_manager.lexical_index if self.config.retrieval_mode == "hybrid" else None
+
     def _update_retriever(self):
         if self.vectorstore is None:
             self.logger.error("Vectorstore is not initialized.")
             raise ValueError("Vectorstore is not initialized. Please load documents first.")
 
+        vectorstore = self.vectorstore
+        lexical_index = self._lexical_index()
         if self.use_reranking:
-            self.logger.info("Using reranker retriever.")
-            self.retriever = create_parent_document_llm_reranker(
-                vectorstore=self.vectorstore,
-                top_k_chunks=self.top_k_chunks,
-                top_k_parents=self.retriever_k
-            )
+            key = ("retriever", self.vectorstore_manager.persist_directory, "rerank", self.config.retriever_key)
+            def build():
+                self.logger.info(f"Using {self.config.rerank_mode} reranker retriever ({self.config.retrieval_mode} candidates).")
+                return create_parent_document_llm_reranker(
+                    vectorstore=vectorstore,
+                    top_k_chunks=self.top_k_chunks,
+                    top_k_parents=self.retriever_k,
+                    scorer=self.cross_encoder,
+                    lexical_index=lexical_index,
+                    rerank_mode=self.config.rerank_mode,
+                    aggregation=self.config.rerank_aggregation,
+                    top_n=self.config.rerank_top_n,
+                    window_size=self.config.rerank_window
+                )
+        elif lexical_index is not None:
+            key = ("retriever", self.vectorstore_manager.persist_directory, "hybrid", self.retriever_k, self.top_k_chunks)
+            def build():
+                self.logger.info(f"Using hybrid BM25 + vector retriever with k={self.retriever_k}.")
+                return HybridRetriever(vectorstore=vectorstore, lexical_index=lexical_index, k=self.retriever_k, fetch_k=self.top_k_chunks)
         else:
-            self.logger.info(f"Using standard retriever with k={self.retriever_k}.")
-            self.retriever = self.vectorstore.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": self.retriever_k}
-            )
+            key = ("retriever", self.vectorstore_manager.persist_directory, "similarity", self.retriever_k)
+            def build():
+                self.logger.info(f"Using standard retriever with k={self.retriever_k}.")
+                return vectorstore.as_retriever(
+                    search_type="similarity",
+                    search_kwargs={"k": self.retriever_k}
+                )
 
-    def load_documents(self, urls: str):
-        self.logger.info(f"Loading and chunking documents from {len(urls)} URLs...")
-        chunks = self.doc_handler.load_and_chunk_pdfs(urls)
-        self.vectorstore = VectorstoreManager(self.embedding_model).store_documents(chunks)
-        self.logger.info("Documents stored in vectorstore.")
+        self.retriever = self.resources.get(
+            key,
+            lambda: LockedRetriever(retriever=build(), lock=self.vectorstore_manager.lock, vectorstore=vectorstore, lexical_index=lexical_index),
+            is_stale=lambda retriever: retriever.vectorstore is not vectorstore or retriever.lexical_index is not lexical_index
+        )
+
+    def _superseded_parents(self, chunks) -> set:
+        current = {}
+        for chunk in chunks:
+            current.setdefault(chunk.metadata.get("source"), set()).add(chunk.metadata.get("parent_id"))
+        superseded = set()
+        for source, parent_ids in current.items():
+            if not source:
+                continue
+            candidates = self.vectorstore_manager.parents_of(source) + [legacy_parent_id(source)]
+            superseded.update(p for p in candidates if p in self.vectorstore_manager.parents and p not in parent_ids)
+        return superseded
+
+    def load_documents(self, urls: str, progress_callback=None) -> Dict[str, str]:
+        failures: Dict[str, str] = {}
+        with self.ingest_lock:
+            new_urls = [url for url in urls if url not in self.loaded_urls]
+            if new_urls:
+                self.logger.info(f"Loading and chunking documents from {len(new_urls)} URLs...")
+                chunks = self.doc_handler.load_and_chunk_pdfs(new_urls, progress_callback=progress_callback, failures=failures)
+                superseded = self._superseded_parents(chunks)
+                if superseded:
+                    self.logger.info(f"Removing {len(superseded)} superseded document versions: {', '.join(sorted(superseded))}")
+                    self.vectorstore_manager.remove_parents(sorted(superseded))
+                self.vectorstore_manager.store_documents(chunks)
+                self.loaded_urls.update(url for url in new_urls if url not in failures)
+                self.logger.info("Documents stored in vectorstore.")
+            else:
+                self.logger.info("All documents already loaded in the shared vectorstore.")
         self._update_retriever()
+        return failures
+
+    def configure(self, config: PipelineConfig) -> set:
+        changed = self.config.diff(config)
+        if not changed:
+            return changed
+        self.logger.info(f"Updating pipeline configuration: {', '.join(sorted(changed))}")
+        self.config = config
+        if {"cross_encoder_model", "cross_encoder_batch_size"} & changed:
+            self.cross_encoder = self._get_cross_encoder(config.cross_encoder_model, config.cross_encoder_batch_size)
+        if set(RETRIEVER_FIELDS) & changed and self.vectorstore is not None:
+            self._update_retriever()
+        return changed
 
     def set_prompt_type(self, prompt_type: str, additional_instruction: str = None):
-        self.logger.info(f"Setting prompt type: {prompt_type}")
-        self.prompt_type = prompt_type
-        self.additional_prompt_instruction = additional_instruction
+        self.configure(replace(self.config, prompt_type=prompt_type, additional_instruction=additional_instruction))
 
     def set_use_reranker(self, enabled: bool):
-        self.logger.info(f"Setting reranker: {enabled}")
-        self.use_reranking = enabled
-        self._update_retriever()
+        self.configure(replace(self.config, use_reranking=enabled))
 
-    def set_memory(self, enabled: bool):
-        self.logger.info(f"Setting memory: {enabled}")
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            input_key="question",
-            output_key="answer",
-            return_messages=True
-        ) if enabled else None
+    def set_cross_encoder(self, model_name: str = DEFAULT_CROSS_ENCODER_MODEL, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.configure(replace(self.config, cross_encoder_model=model_name, cross_encoder_batch_size=batch_size))
+
+    def set_memory(self, enabled: bool, mode: str = "buffer", max_token_limit: int = DEFAULT_MEMORY_TOKENS):
+        if mode not in MEMORY_MODES:
+            raise ValueError(f"Unknown memory mode: {mode}. Expected one of {MEMORY_MODES}.")
+        if enabled and mode == "summary" and isinstance(self.memory, SummarizingMemory):
+            if self.memory.max_token_limit != max_token_limit:
+                self.logger.info(f"Resizing summarizing memory to {max_token_limit} tokens.")
+                self.memory.set_max_token_limit(max_token_limit)
+            return
+        self.logger.info(f"Setting memory: {enabled} (mode: {mode})")
+        if not enabled:
+            self.memory = None
+        elif mode == "summary":
+            self.memory = SummarizingMemory(llm=self.llm, max_token_limit=max_token_limit)
+        else:
+            from langchain.memory import ConversationBufferMemory
+            self.memory = ConversationBufferMemory(
+                memory_key="chat_history",
+                input_key="question",
+                output_key="answer",
+                return_messages=True
+            )
 
     def set_query_rewriting(self, enabled: bool):
-        self.logger.info(f"Setting query rewriting: {enabled}")
-        self.rewrite = enabled
+        self.configure(replace(self.config, rewrite=enabled))
+
+    def _ensure_retriever(self):
+        if (self.retriever is None or self.retriever.vectorstore is not self.vectorstore
+                or self.retriever.lexical_index is not self._lexical_index()):
+            self._update_retriever()
+
+    def _get_prompt(self) -> PromptTemplate:
+        key = (self.prompt_type, self.additional_prompt_instruction)
+        if key not in self._prompts:
+            template = self.prompt_manager.get_prompt(self.prompt_type).template
+            if self.additional_prompt_instruction:
+                template += f"\n\nInstruction: {self.additional_prompt_instruction}"
+            self._prompts[key] = PromptTemplate.from_template(template)
+        return self._prompts[key]
 
     def get_chain(self):
-        self.logger.info(f"Building RAG chain with prompt: {self.prompt_type}")
-        template = self.prompt_manager.get_prompt(self.prompt_type).template
-        if self.additional_prompt_instruction:
-            template += f"\n\nInstruction: {self.additional_prompt_instruction}"
-        prompt = PromptTemplate.from_template(template)
+        self._ensure_retriever()
+        key = (self.config.chain_key, id(self.retriever), id(self.memory))
+        chain = self._chains.get(key)
+        if chain is None:
+            chain = self._build_chain()
+            if len(self._chains) >= MAX_CACHED_CHAINS:
+                self._chains.pop(next(iter(self._chains)))
+            self._chains[key] = chain
+        return chain
 
+    def _build_chain(self):
+        if self.rewrite or self.config.answer_cache or self.config.context_token_budget is not None or self.memory is not None:
+            self.logger.info(f"Using staged query path (query rewriting: {self.rewrite}, answer cache: {self.config.answer_cache}, "
+                             f"context budget: {self.config.context_token_budget}, memory: {self.memory is not None}).")
+            def wrapped(inputs):
+                return self.query(inputs["question"])
+            return wrapped
+
+        self.logger.info(f"Building RAG chain with prompt: {self.prompt_type}")
+        from langchain.chains import ConversationalRetrievalChain
         chain = ConversationalRetrievalChain.from_llm(
             llm=self.llm,
             retriever=self.retriever,
-            combine_docs_chain_kwargs={"prompt": prompt},
+            combine_docs_chain_kwargs={"prompt": self._get_prompt()},
             memory=self.memory,
             return_source_documents=True
         )
+        self.logger.info("Returning standard chain.")
+        return chain
+
+    def _fit_context(self, docs):
+        if self.config.context_token_budget is None:
+            return docs
+        fitted = fit_token_budget(docs, self.config.context_token_budget)
+        self.logger.info(f"Kept {len(fitted)} of {len(docs)} chunks within a {self.config.context_token_budget} token context budget.")
+        return fitted
+
+    def _retrieve(self, question: str, search_question: str):
+        if not self.config.rewrite_fusion or search_question == question:
+            return self._fit_context(self.retriever.invoke(search_question))
+        results = self.retriever.batch([question, search_question])
+        self.logger.info(f"Fusing {[len(r) for r in results]} results for original and rewritten query.")
+        return self._fit_context(reciprocal_rank_fusion(results, top_n=max(len(r) for r in results)))
+
+    async def _aretrieve(self, question: str, search_question: str):
+        if not self.config.rewrite_fusion or search_question == question:
+            return self._fit_context(await self.retriever.ainvoke(search_question))
+        results = await self.retriever.abatch([question, search_question])
+        self.logger.info(f"Fusing {[len(r) for r in results]} results for original and rewritten query.")
+        return self._fit_context(reciprocal_rank_fusion(results, top_n=max(len(r) for r in results)))
+
+    def _search_batch(self, queries: List[str]) -> List[List]:
+        embed_queries = getattr(self.embedding_model, "embed_queries", self.embedding_model.embed_documents)
+        vectors = embed_queries(queries)
+        lexical_index = self._lexical_index()
+        fetch_k = self.top_k_chunks if self.use_reranking or lexical_index is not None else self.retriever_k
+        with self.vectorstore_manager.lock.read():
+            vectorstore = self.vectorstore
+            if lexical_index is not None:
+                results = hybrid_search_by_vectors(vectorstore, lexical_index, queries, vectors, fetch_k)
+            else:
+                results = similarity_search_by_vectors(vectorstore, vectors, fetch_k)
+        if self.use_reranking:
+            return self.retriever.retriever.rerank_batch(queries, results)
+        return [[doc for doc, _ in hits[:self.retriever_k]] for hits in results]
+
+    def retrieve_batch(self, questions: List[str], search_questions: List[str] = None) -> List[List]:
+        self._ensure_retriever()
+        search_questions = search_questions or questions
+        groups = [
+            [search] if not self.config.rewrite_fusion or search == question else [question, search]
+            for question, search in zip(questions, search_questions)
+        ]
+        with self.metrics.span("retrieve", mode="batch"):
+            ranked = iter(self._search_batch([query for group in groups for query in group]))
+        self.logger.info(f"Retrieved context for {len(questions)} questions in one batch.")
+
+        results = []
+        for group in groups:
+            lists = [next(ranked) for _ in group]
+            docs = lists[0] if len(lists) == 1 else reciprocal_rank_fusion(lists, top_n=max(len(r) for r in lists))
+            results.append(self._fit_context(docs))
+        return results
+
+    def generate(self, question: str, docs) -> str:
+        with self.metrics.span("generate"):
+            return _message_text(self.llm.invoke(self._format_prompt(question, docs)))
+
+    def _has_chat_history(self) -> bool:
+        return self.memory is not None and bool(self.memory.chat_memory.messages)
+
+    def _cache_scope(self) -> tuple:
+        return (self.config.chain_key, self.config.retriever_key, self.vectorstore_manager.version)
+
+    def _remember(self, question: str, answer: str):
+        if self.memory is not None:
+            self.memory.save_context({"question": question}, {"answer": answer})
+
+    def _cached_events(self, question: str, cached: CachedAnswer) -> List[dict]:
+        self.logger.info("Answer cache hit.")
+        self._remember(question, cached.answer)
+        return [
+            {"type": "sources", "documents": cached.source_documents},
+            {"type": "token", "text": cached.answer},
+            {"type": "answer", "question": question, "answer": cached.answer, "source_documents": cached.source_documents, "cached": True}
+        ]
+
+    def _format_prompt(self, question: str, docs) -> str:
+        context = "\n\n".join(doc.page_content for doc in docs)
+        return self._get_prompt().format(context=context, question=question)
+
+    def _uses_history(self, question: str) -> bool:
+        return self._has_chat_history() and depends_on_history(question)
 
+    def _needs_condense(self, question: str) -> bool:
+        if not self._has_chat_history():
+            return False
+        if not depends_on_history(question):
+            self.logger.info("Question is standalone, skipping the condense step.")
+            self.metrics.inc("rag_condense_total", result="skipped")
+            return False
+        self.metrics.inc("rag_condense_total", result="llm")
+        return True
+
+    def _condense_inputs(self, question: str) -> dict:
+        return {"question": question, "chat_history": get_buffer_string(self.memory.load_memory_variables({})["chat_history"])}
+
+    def _condense(self, question: str) -> str:
+        if not self._needs_condense(question):
+            return question
+        with self.metrics.span("condense"):
+            return _message_text((_condense_prompt() | self.llm).invoke(self._condense_inputs(question)))
+
+    async def _acondense(self, question: str) -> str:
+        if not self._needs_condense(question):
+            return question
+        with self.metrics.span("condense"):
+            return _message_text(await (_condense_prompt() | self.llm).ainvoke(self._condense_inputs(question)))
+
+    def _finish(self, question: str, answer: str, docs, use_cache: bool, scope: tuple, chunk_ids, vector) -> dict:
+        if use_cache:
+            self.answer_cache.store(question, scope, chunk_ids, answer, docs, vector)
+        self._remember(question, answer)
+        return {"type": "answer", "question": question, "answer": answer, "source_documents": docs}
+
+    def _timed_tokens(self, chunks) -> Iterator[str]:
+        chunks = iter(chunks)
+        elapsed, first = 0.0, True
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                except Exception:
+                    self.metrics.inc("rag_stage_errors_total", stage="generate")
+                    raise
+                finally:
+                    elapsed += time.perf_counter() - start
+                if first:
+                    self.metrics.observe("rag_time_to_first_token_seconds", elapsed)
+                    first = False
+                yield _message_text(chunk)
+        finally:
+            self.metrics.observe_stage("generate", elapsed)
+
+    async def _atimed_tokens(self, chunks) -> AsyncIterator[str]:
+        chunks = chunks.__aiter__()
+        elapsed, first = 0.0, True
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    break
+                except Exception:
+                    self.metrics.inc("rag_stage_errors_total", stage="generate")
+                    raise
+                finally:
+                    elapsed += time.perf_counter() - start
+                if first:
+                    self.metrics.observe("rag_time_to_first_token_seconds", elapsed)
+                    first = False
+                yield _message_text(chunk)
+        finally:
+            self.metrics.observe_stage("generate", elapsed)
+
+    def stream_query(self, question: str) -> Iterator[dict]:
+        self._ensure_retriever()
+        self.metrics.inc("rag_queries_total")
+        use_cache = self.config.answer_cache and not self._uses_history(question)
+        scope, vector = self._cache_scope(), None
+        if use_cache and self.config.semantic_cache_threshold is not None:
+            vector = self.embedding_model.embed_query(normalize_question(question))
+            cached = self.answer_cache.lookup_similar(vector, scope, self.config.semantic_cache_threshold)
+            if cached:
+                yield from self._cached_events(question, cached)
+                return
+
+        standalone = self._condense(question)
+        search_question = standalone
         if self.rewrite:
-            self.logger.info("Wrapping chain with query rewriting.")
-            def wrapped(inputs):
-                inputs["question"] = self.prompt_manager.rewrite_query(inputs["question"], self.llm, self.retriever)
-                self.logger.info(f"Rewritten query: {inputs['question']}")
-                return chain.invoke(inputs)
-            return wrapped
+            with self.metrics.span("rewrite"):
+                search_question = self.query_rewriter.rewrite(standalone)
+        with self.metrics.span("retrieve"):
+            docs = self._retrieve(standalone, search_question)
+        chunk_ids = [doc.metadata.get("chunk_id") or doc.id for doc in docs]
+        if use_cache:
+            cached = self.answer_cache.lookup(question, scope, chunk_ids)
+            if cached:
+                yield from self._cached_events(question, cached)
+                return
 
-        self.logger.info("Returning standard chain.")
-        return chain
\ No newline at end of file
+        yield {"type": "sources", "documents": docs}
+        parts = []
+        for text in self._timed_tokens(self.llm.stream(self._format_prompt(search_question, docs))):
+            parts.append(text)
+            yield {"type": "token", "text": text}
+        yield self._finish(question, "".join(parts), docs, use_cache, scope, chunk_ids, vector)
+
+    async def astream_query(self, question: str) -> AsyncIterator[dict]:
+        self._ensure_retriever()
+        self.metrics.inc("rag_queries_total")
+        use_cache = self.config.answer_cache and not self._uses_history(question)
+        scope, vector = self._cache_scope(), None
+        if use_cache and self.config.semantic_cache_threshold is not None:
+            vector = await self.embedding_model.aembed_query(normalize_question(question))
+            cached = self.answer_cache.lookup_similar(vector, scope, self.config.semantic_cache_threshold)
+            if cached:
+                for event in self._cached_events(question, cached):
+                    yield event
+                return
+
+        standalone = await self._acondense(question)
+        search_question = standalone
+        if self.rewrite:
+            with self.metrics.span("rewrite"):
+                search_question = await self.query_rewriter.arewrite(standalone)
+        with self.metrics.span("retrieve"):
+            docs = await self._aretrieve(standalone, search_question)
+        chunk_ids = [doc.metadata.get("chunk_id") or doc.id for doc in docs]
+        if use_cache:
+            cached = self.answer_cache.lookup(question, scope, chunk_ids)
+            if cached:
+                for event in self._cached_events(question, cached):
+                    yield event
+                return
+
+        yield {"type": "sources", "documents": docs}
+        parts = []
+        async for text in self._atimed_tokens(self.llm.astream(self._format_prompt(search_question, docs))):
+            parts.append(text)
+            yield {"type": "token", "text": text}
+        yield self._finish(question, "".join(parts), docs, use_cache, scope, chunk_ids, vector)
+
+    def query(self, question: str) -> dict:
+        result = {}
+        for event in self.stream_query(question):
+            if event["type"] == "answer":
+                result = event
+        return result
+
+    async def aquery(self, question: str) -> dict:
+        result = {}
+        async for event in self.astream_query(question):
+            if event["type"] == "answer":
+                result = event
+        return result
\ No newline at end of file
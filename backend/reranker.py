@@ -1,21 +1,42 @@
+import asyncio
 from typing import List
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
-from sentence_transformers import CrossEncoder
+from backend.cross_encoder import CrossEncoderScorer
+from backend.retrievers import ahybrid_search_with_score, hybrid_search_with_score
+from backend.metrics import get_metrics
 from backend.logging import get_logger 
 
-def create_parent_document_llm_reranker(vectorstore, top_k_chunks=20, top_k_parents=4):
+RERANK_MODES = ("parent", "chunk", "window")
+AGGREGATIONS = ("max", "mean", "top_n")
+
+def aggregate_scores(scores: List[float], aggregation: str = "max", top_n: int = 2) -> float:
+    if not scores:
+        return 0.0
+    if aggregation == "max":
+        return max(scores)
+    if aggregation == "mean":
+        return sum(scores) / len(scores)
+    best = sorted(scores, reverse=True)[:top_n]
+    return sum(best) / len(best)
+
+def create_parent_document_llm_reranker(vectorstore, top_k_chunks=20, top_k_parents=4, scorer: CrossEncoderScorer = None, lexical_index=None,
+                                        rerank_mode="parent", aggregation="max", top_n=2, window_size=2):
+    if scorer is None:
+        scorer = CrossEncoderScorer()
+    metrics = get_metrics()
+    if rerank_mode not in RERANK_MODES:
+        raise ValueError(f"Unknown rerank mode: {rerank_mode}. Expected one of {RERANK_MODES}.")
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown score aggregation: {aggregation}. Expected one of {AGGREGATIONS}.")
+
     class LLMRerankerRetriever(BaseRetriever):
         def __init__(self):
             super().__init__()
             object.__setattr__(self, "logger", get_logger(self.__class__.__name__))
             self.logger.info("LLMRerankerRetriever initialized.")
 
-        def _get_relevant_documents(self, query: str) -> List[Document]:
-            self.logger.info(f"Starting reranked retrieval for query: {query}")
-            cross_encoder = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
-
-            results = vectorstore.similarity_search_with_score(query, k=top_k_chunks)
+        def _group_parents(self, results):
             self.logger.info(f"Retrieved {len(results)} chunks from vectorstore.")
 
             chunks = [doc for doc, _ in results]
@@ -28,32 +49,70 @@ def create_parent_document_llm_reranker(vectorstore, top_k_chunks=20, top_k_pare
                     parent_docs[parent_id] = {
                         "chunks": [],
                         "scores": [],
-                        "source": chunk.metadata.get("parent_source", "unknown")
+                        "source": chunk.metadata.get("parent_source", chunk.metadata.get("source", "unknown"))
                     }
                 parent_docs[parent_id]["chunks"].append(chunk)
                 parent_docs[parent_id]["scores"].append(score)
 
             self.logger.info(f"Grouped chunks into {len(parent_docs)} parent documents.")
 
-            reranked = []
-            for parent_id, parent in parent_docs.items():
+            for parent in parent_docs.values():
                 parent["chunks"].sort(key=lambda c: (c.metadata.get("page", 0), c.metadata.get("chunk_index", 0)))
-                full_text = "\n".join(chunk.page_content for chunk in parent["chunks"])
+                parent["text"] = "\n".join(chunk.page_content for chunk in parent["chunks"])
+            return parent_docs
 
-                try:
-                    rerank_score = float(cross_encoder.predict([(query, full_text)])[0])
-                except Exception as e:
-                    self.logger.warning(f"CrossEncoder prediction failed for parent {parent_id}: {e}")
-                    rerank_score = 0.0
+        def _units(self, parent_docs):
+            units = []
+            for parent_id, parent in parent_docs.items():
+                chunks = parent["chunks"]
+                if rerank_mode == "parent":
+                    units.append((parent_id, range(len(chunks)), parent["text"]))
+                    continue
+                size = 1 if rerank_mode == "chunk" else window_size
+                for start in range(max(1, len(chunks) - size + 1)):
+                    members = range(start, min(start + size, len(chunks)))
+                    units.append((parent_id, members, "\n".join(chunks[i].page_content for i in members)))
+            self.logger.info(f"Scoring {len(units)} {rerank_mode} units for {len(parent_docs)} parents.")
+            return units
+
+        def _score_pairs(self, pairs) -> List[float]:
+            try:
+                with metrics.span("rerank", mode=rerank_mode):
+                    return scorer.score_pairs(pairs)
+            except Exception as e:
+                self.logger.warning(f"CrossEncoder prediction failed for {len(pairs)} units: {e}")
+                return [0.0] * len(pairs)
+
+        def _score(self, query: str, units) -> List[float]:
+            return self._score_pairs([(query, text) for _, _, text in units])
+
+        def _select(self, parent_docs, units, unit_scores: List[float]) -> List[Document]:
+            parent_scores = {parent_id: [] for parent_id in parent_docs}
+            chunk_scores = {}
+            for (parent_id, members, _), score in zip(units, unit_scores):
+                parent_scores[parent_id].append(score)
+                for i in members:
+                    chunk_scores[(parent_id, i)] = max(score, chunk_scores.get((parent_id, i), score))
+
+            reranked = []
+            for parent_id, parent in parent_docs.items():
+                rerank_score = aggregate_scores(parent_scores[parent_id], aggregation, top_n)
+                self.logger.debug(f"Rerank score for parent {parent_id}: {rerank_score:.4f}")
 
-                self.logger.info(f"Rerank score for parent {parent_id}: {rerank_score:.4f}")
+                chunks = []
+                for i, chunk in enumerate(parent["chunks"]):
+                    metadata = {**chunk.metadata, "rerank_score": rerank_score}
+                    if rerank_mode != "parent":
+                        metadata["chunk_rerank_score"] = chunk_scores[(parent_id, i)]
+                    chunks.append(Document(id=chunk.id, page_content=chunk.page_content, metadata=metadata))
 
-                for chunk in parent["chunks"]:
-                    chunk.metadata["rerank_score"] = rerank_score
+                if rerank_mode != "parent":
+                    order = sorted(range(len(chunks)), key=lambda i: chunk_scores[(parent_id, i)], reverse=True)
+                    chunks = [chunks[i] for i in order]
 
                 reranked.append({
                     "id": parent_id,
-                    "chunks": parent["chunks"],
+                    "chunks": chunks,
                     "rerank_score": rerank_score,
                     "source": parent["source"]
                 })
@@ -62,13 +121,44 @@ def create_parent_document_llm_reranker(vectorstore, top_k_chunks=20, top_k_pare
 
             top_docs = []
             for i, parent in enumerate(reranked[:top_k_parents]):
-                self.logger.info(f"Selected parent {i+1}: {parent['id']} (Score: {parent['rerank_score']:.4f})")
+                self.logger.debug(f"Selected parent {i+1}: {parent['id']} (Score: {parent['rerank_score']:.4f})")
                 top_docs.extend(parent["chunks"])
 
             self.logger.info(f"Returning {len(top_docs)} top-ranked chunks.")
             return top_docs
 
-        async def _aget_relevant_documents(self, query: str):
-            raise NotImplementedError("Async version is not implemented.")
+        def _get_relevant_documents(self, query: str) -> List[Document]:
+            self.logger.info(f"Starting reranked retrieval for query: {query}")
+            if lexical_index is not None:
+                results = hybrid_search_with_score(vectorstore, lexical_index, query, top_k_chunks)
+            else:
+                results = vectorstore.similarity_search_with_score(query, k=top_k_chunks)
+            parent_docs = self._group_parents(results)
+            units = self._units(parent_docs)
+            return self._select(parent_docs, units, self._score(query, units))
+
+        async def _aget_relevant_documents(self, query: str) -> List[Document]:
+            self.logger.info(f"Starting async reranked retrieval for query: {query}")
+            if lexical_index is not None:
+                results = await ahybrid_search_with_score(vectorstore, lexical_index, query, top_k_chunks)
+            else:
+                results = await vectorstore.asimilarity_search_with_score(query, k=top_k_chunks)
+            parent_docs = self._group_parents(results)
+            units = self._units(parent_docs)
+            unit_scores = await asyncio.to_thread(self._score, query, units)
+            return self._select(parent_docs, units, unit_scores)
+
+        def rerank_batch(self, queries: List[str], results_per_query) -> List[List[Document]]:
+            prepared = []
+            for query, results in zip(queries, results_per_query):
+                parent_docs = self._group_parents(results)
+                prepared.append((query, parent_docs, self._units(parent_docs)))
+            scores = self._score_pairs([(query, text) for query, _, units in prepared for _, _, text in units])
+
+            reranked, offset = [], 0
+            for query, parent_docs, units in prepared:
+                reranked.append(self._select(parent_docs, units, scores[offset:offset + len(units)]))
+                offset += len(units)
+            return reranked
 
     return LLMRerankerRetriever()
@@ -0,0 +1,98 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable
+from backend.logging import get_logger
+
+@contextmanager
+def file_lock(path: str):
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+class ReadWriteLock:
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+class ResourceRegistry:
+    def __init__(self):
+        self.logger = get_logger(self.__class__.__name__)
+        self._resources: Dict[Hashable, Any] = {}
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, factory: Callable[[], Any], is_stale: Callable[[Any], bool] = None) -> Any:
+        resource = self._resources.get(key)
+        if resource is not None and not (is_stale and is_stale(resource)):
+            return resource
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            resource = self._resources.get(key)
+            if resource is None or (is_stale and is_stale(resource)):
+                self.logger.info(f"Creating shared resource: {key}")
+                self._resources[key] = factory()
+        return self._resources[key]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._resources
+
+    def clear(self, key: Hashable = None):
+        with self._lock:
+            if key is None:
+                self._resources.clear()
+            else:
+                self._resources.pop(key, None)
+
+_registry = ResourceRegistry()
+
+def get_registry() -> ResourceRegistry:
+    return _registry
@@ -0,0 +1,96 @@
+import asyncio
+import faiss
+import numpy as np
+from typing import Any, Dict, List, Sequence, Tuple
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from backend.lexical_index import BM25Index
+
+class LockedRetriever(BaseRetriever):
+    retriever: BaseRetriever
+    lock: Any
+    vectorstore: Any = None
+    lexical_index: Any = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with self.lock.read():
+            return self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        return await asyncio.to_thread(self._get_relevant_documents, query, run_manager=run_manager.get_sync())
+
+def _fusion_key(doc: Document) -> str:
+    return doc.metadata.get("chunk_id") or doc.id or doc.page_content
+
+def fuse_ranked(result_lists: Sequence[List[Document]], k: int = 60) -> List[Tuple[Document, float]]:
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = _fusion_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            docs.setdefault(key, doc)
+    return [(docs[key], scores[key]) for key in sorted(scores, key=scores.get, reverse=True)]
+
+def reciprocal_rank_fusion(result_lists: Sequence[List[Document]], k: int = 60, top_n: int = None) -> List[Document]:
+    fused = fuse_ranked(result_lists, k)
+    if top_n is not None:
+        fused = fused[:top_n]
+    return [doc for doc, _ in fused]
+
+def lexical_search(vectorstore, lexical_index: BM25Index, query: str, k: int) -> List[Document]:
+    docs = []
+    for doc_id, score in lexical_index.search(query, k):
+        doc = vectorstore.docstore.search(doc_id)
+        if isinstance(doc, Document):
+            docs.append(Document(id=doc_id, page_content=doc.page_content, metadata=dict(doc.metadata, bm25_score=score)))
+    return docs
+
+def hybrid_search_with_score(vectorstore, lexical_index: BM25Index, query: str, k: int) -> List[Tuple[Document, float]]:
+    dense = [doc for doc, _ in vectorstore.similarity_search_with_score(query, k=k)]
+    return fuse_ranked([dense, lexical_search(vectorstore, lexical_index, query, k)])[:k]
+
+async def ahybrid_search_with_score(vectorstore, lexical_index: BM25Index, query: str, k: int) -> List[Tuple[Document, float]]:
+    dense = [doc for doc, _ in await vectorstore.asimilarity_search_with_score(query, k=k)]
+    return fuse_ranked([dense, lexical_search(vectorstore, lexical_index, query, k)])[:k]
+
+def similarity_search_by_vectors(vectorstore, vectors: Sequence[Sequence[float]], k: int) -> List[List[Tuple[Document, float]]]:
+    matrix = np.array(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    if len(matrix) == 0 or vectorstore.index.ntotal == 0:
+        return [[] for _ in range(len(matrix))]
+    if getattr(vectorstore, "_normalize_L2", False):
+        faiss.normalize_L2(matrix)
+    distances, rows = vectorstore.index.search(matrix, min(k, vectorstore.index.ntotal))
+    results = []
+    for row_distances, row_ids in zip(distances, rows):
+        hits = []
+        for distance, row in zip(row_distances, row_ids):
+            if row == -1:
+                continue
+            doc_id = vectorstore.index_to_docstore_id[int(row)]
+            doc = vectorstore.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                hits.append((Document(id=doc_id, page_content=doc.page_content, metadata=dict(doc.metadata)), float(distance)))
+        results.append(hits)
+    return results
+
+def hybrid_search_by_vectors(vectorstore, lexical_index: BM25Index, queries: Sequence[str], vectors: Sequence[Sequence[float]],
+                             k: int) -> List[List[Tuple[Document, float]]]:
+    dense_results = similarity_search_by_vectors(vectorstore, vectors, k)
+    return [
+        fuse_ranked([[doc for doc, _ in dense], lexical_search(vectorstore, lexical_index, query, k)])[:k]
+        for query, dense in zip(queries, dense_results)
+    ]
+
+class HybridRetriever(BaseRetriever):
+    vectorstore: Any
+    lexical_index: Any
+    k: int = 4
+    fetch_k: int = 20
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [doc for doc, _ in hybrid_search_with_score(self.vectorstore, self.lexical_index, query, self.fetch_k)[:self.k]]
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        return [doc for doc, _ in (await ahybrid_search_with_score(self.vectorstore, self.lexical_index, query, self.fetch_k))[:self.k]]
@@ -0,0 +1,31 @@
+from typing import Callable, List
+from langchain_core.documents import Document
+
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+def _truncate(doc: Document, budget: int, count_tokens: Callable[[str], int]) -> Document:
+    low, high = 0, len(doc.page_content)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(doc.page_content[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return Document(id=doc.id, page_content=doc.page_content[:low], metadata=dict(doc.metadata))
+
+def fit_token_budget(docs: List[Document], budget: int, count_tokens: Callable[[str], int] = estimate_tokens) -> List[Document]:
+    if budget is None:
+        return docs
+    selected, used = [], 0
+    for i, doc in enumerate(docs):
+        tokens = count_tokens(doc.page_content)
+        if used + tokens > budget:
+            if i == 0:
+                return [_truncate(doc, budget, count_tokens)]
+            continue
+        selected.append(doc)
+        used += tokens
+    return selected
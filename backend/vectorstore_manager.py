@@ -1,42 +1,432 @@
 import os
+import json
+import uuid
+import faiss
+import shutil
+import threading
 from pathlib import Path
-from typing import List, Union
+import numpy as np
+from typing import Dict, List, Tuple
 from langchain.schema import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
+from backend.columnar_store import is_columnar, load_columnar, save_columnar
+from backend.ann_index import build_index, index_kind, min_training_points, recall_against_flat, resolve_params, set_search_params
+from backend.lexical_index import LEXICAL_FILE, BM25Index, has_lexical_index
+from backend.metrics import get_metrics
+from backend.resource_registry import ReadWriteLock
 from backend.logging import get_logger
 
+MANIFEST_FILE = "manifest.json"
+MANIFEST_LOG = "manifest.log"
+DELTA_FOLDER = "deltas"
+STORAGE_FORMATS = ("columnar", "pickle")
+
 class VectorstoreManager:
-    def __init__(self, embedding_model, persist_directory: str = "faiss_index"):
+    def __init__(self, embedding_model, persist_directory: str = "faiss_index", compact_after: int = 8,
+                 index_type: str = "flat", index_params: Dict = None, storage_format: str = "columnar"):
+        if storage_format not in STORAGE_FORMATS:
+            raise ValueError(f"Unknown storage format: {storage_format}. Expected one of {STORAGE_FORMATS}.")
         self.logger = get_logger(self.__class__.__name__)
+        self.metrics = get_metrics()
         self.embedding_model = embedding_model
         self.persist_directory = persist_directory
-        
+        self.compact_after = compact_after
+        self.index_type = index_type
+        self.index_params = resolve_params(index_params)
+        self.storage_format = storage_format
+        self.build_report: Dict = {}
+        self.vectorstore = None
+        self.lexical_index: BM25Index = None
+        self.base: str = None
+        self.parents: Dict[str, List[str]] = {}
+        self.deltas: List[str] = []
+        self.version = 0
+        self._listeners = []
+        self.lock = ReadWriteLock()
+        self._ingest_lock = threading.Lock()
+        self._loaded = False
+        self._mmapped = False
+        self._base_index: faiss.Index = None
+        self._delta_index: faiss.Index = None
+
+    @property
+    def _manifest_path(self) -> Path:
+        return Path(self.persist_directory) / MANIFEST_FILE
+
+    @property
+    def _delta_root(self) -> Path:
+        return Path(self.persist_directory) / DELTA_FOLDER
+
+    @property
+    def _manifest_log_path(self) -> Path:
+        return Path(self.persist_directory) / MANIFEST_LOG
+
+    def _save_manifest(self):
+        tmp_path = self._manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"base": self.base, "parents": self.parents, "deltas": self.deltas}, f)
+        os.replace(tmp_path, self._manifest_path)
+        if self._manifest_log_path.exists():
+            os.remove(self._manifest_log_path)
+
+    def _append_manifest_log(self, delta_name: str, parents: Dict[str, List[str]]):
+        with open(self._manifest_log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"base": self.base, "delta": delta_name, "parents": parents}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _replay_manifest_log(self):
+        if not self._manifest_log_path.exists():
+            return
+        data = self._manifest_log_path.read_bytes()
+        if not data.endswith(b"\n"):
+            self.logger.warning("Dropping a partially written manifest log entry.")
+            data = data[:data.rfind(b"\n") + 1]
+            with open(self._manifest_log_path, "r+b") as f:
+                f.truncate(len(data))
+        for line in data.decode("utf-8").splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get("base") != self.base or entry["delta"] in self.deltas:
+                continue
+            self.deltas.append(entry["delta"])
+            for parent_id, doc_ids in entry["parents"].items():
+                self.parents.setdefault(parent_id, []).extend(doc_ids)
+
+    @property
+    def _base_path(self) -> Path:
+        return Path(self.persist_directory) / self.base if self.base else Path(self.persist_directory)
+
+    def _save_store(self, store: FAISS, path: Path):
+        if self.storage_format == "columnar":
+            save_columnar(store, path)
+        else:
+            store.save_local(str(path))
+
+    def _load_store(self, path: Path, use_mmap: bool = False) -> FAISS:
+        if is_columnar(path):
+            return load_columnar(path, self.embedding_model, use_mmap=use_mmap)
+        return FAISS.load_local(str(path), self.embedding_model, allow_dangerous_deserialization=True)
+
+    def _write_base(self):
+        previous = self._base_path
+        base = f"base_{uuid.uuid4().hex[:12]}"
+        path = Path(self.persist_directory) / base
+        store = self.vectorstore
+        if self._delta_index is not None:
+            store = FAISS(
+                embedding_function=self.embedding_model,
+                index=self._merged_index(),
+                docstore=store.docstore,
+                index_to_docstore_id=store.index_to_docstore_id
+            )
+        self._save_store(store, path)
+        self.lexical_index.save(path)
+        mapped = self._map_base(path) if self.storage_format == "columnar" else None
+
+        with self.lock.write():
+            if mapped is not None:
+                store, lexical_index = mapped
+                self.vectorstore.index_to_docstore_id = store.index_to_docstore_id
+                self.vectorstore.docstore = store.docstore
+                self.vectorstore.index = store.index
+                self.lexical_index = lexical_index
+                self._base_index, self._delta_index, self._mmapped = None, None, True
+            self.base = base
+            self.deltas = []
+
+        self._save_manifest()
+        shutil.rmtree(self._delta_root, ignore_errors=True)
+        if previous == Path(self.persist_directory):
+            for name in ("index.faiss", "index.pkl", LEXICAL_FILE):
+                if (previous / name).exists():
+                    os.remove(previous / name)
+        self._remove_stale_bases()
+
+    def _map_base(self, path: Path) -> Tuple[FAISS, BM25Index]:
+        store = load_columnar(path, self.embedding_model, use_mmap=True)
+        set_search_params(store.index, nprobe=self.index_params["nprobe"], ef_search=self.index_params["ef_search"])
+        return store, BM25Index.load(path)
+
+    def _remove_stale_bases(self):
+        for path in Path(self.persist_directory).glob("base_*"):
+            if path.name != self.base and path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _merged_index(self) -> faiss.Index:
+        index = faiss.read_index(str(self._base_path / "index.faiss"))
+        if self._delta_index.ntotal:
+            index.add(self._delta_index.reconstruct_n(0, self._delta_index.ntotal))
+        set_search_params(index, nprobe=self.index_params["nprobe"], ef_search=self.index_params["ef_search"])
+        return index
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self):
+        self.version += 1
+        for callback in self._listeners:
+            try:
+                callback(self.version)
+            except Exception as e:
+                self.logger.warning(f"Vectorstore listener failed: {e}")
+
+    def _shard_deltas(self):
+        base = self.vectorstore.index
+        self._delta_index = faiss.IndexFlat(base.d, base.metric_type)
+        shards = faiss.IndexShards(base.d, False, True)
+        shards.metric_type = base.metric_type
+        shards.add_shard(base)
+        shards.add_shard(self._delta_index)
+        self._base_index = base
+        self.vectorstore.index = shards
+
+    def _add_embeddings(self, texts: List[str], embeddings, metadatas: List[Dict], ids: List[str]):
+        if not self._mmapped:
+            self.vectorstore.add_embeddings(zip(texts, embeddings), metadatas=metadatas, ids=ids)
+            return
+        if self._delta_index is None:
+            self._shard_deltas()
+        vectors = np.array(embeddings, dtype=np.float32)
+        if self.vectorstore._normalize_L2:
+            faiss.normalize_L2(vectors)
+        start = self.vectorstore.index.ntotal
+        self.vectorstore.docstore.add({
+            doc_id: Document(id=doc_id, page_content=text, metadata=metadata)
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        })
+        self.vectorstore.index_to_docstore_id.update({start + i: doc_id for i, doc_id in enumerate(ids)})
+        self._delta_index.add(vectors)
+        self.vectorstore.index.syncWithSubIndexes()
+
+    def _append_store(self, store: FAISS):
+        count = store.index.ntotal
+        if count == 0:
+            return
+        ids = [store.index_to_docstore_id[i] for i in range(count)]
+        docs = [store.docstore.search(doc_id) for doc_id in ids]
+        vectors = store.index.reconstruct_n(0, count)
+        self._add_embeddings([doc.page_content for doc in docs], vectors, [doc.metadata for doc in docs], ids)
+
+    def load(self) -> FAISS:
+        if self._loaded:
+            return self.vectorstore
+        with self._ingest_lock:
+            with self.lock.write():
+                rewrite = self._load()
+            if self.vectorstore is not None and self._needs_rebuild():
+                self.logger.info(f"Persisted index is {index_kind(self.vectorstore.index)}, rebuilding as {self.index_type}.")
+                self._rebuild_index()
+            elif rewrite:
+                self._write_base()
+        return self.vectorstore
+
+    def _load(self) -> bool:
+        if self._loaded:
+            return False
+        self._loaded = True
+
+        manifest = None
+        if self._manifest_path.exists():
+            with open(self._manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            self.base = manifest.get("base")
+            self.parents = manifest.get("parents", {})
+            self.deltas = manifest.get("deltas", [])
+            self._replay_manifest_log()
+
+        if not (self._base_path / "index.faiss").exists():
+            self.logger.info("No existing vectorstore found.")
+            self.base, self.parents, self.deltas = None, {}, []
+            return False
+
+        use_mmap = self.storage_format == "columnar"
+        self.vectorstore = self._load_store(self._base_path, use_mmap=use_mmap)
+        self._mmapped = use_mmap and is_columnar(self._base_path)
+        self.logger.info(f"Loaded existing vectorstore from {self._base_path} (mmap: {self._mmapped}).")
+
+        if self.deltas:
+            for delta in self.deltas:
+                self._append_store(self._load_store(self._delta_root / delta))
+            self.logger.info(f"Applied {len(self.deltas)} vectorstore deltas.")
+
+        lexical_folders = [self._base_path] + [self._delta_root / delta for delta in self.deltas]
+        if all(has_lexical_index(folder) for folder in lexical_folders):
+            self.lexical_index = BM25Index.load(self._base_path)
+            for folder in lexical_folders[1:]:
+                self.lexical_index.merge(BM25Index.load(folder))
+            lexical_missing = False
+        else:
+            self.logger.info("No lexical index found, building it from the docstore.")
+            ids = [self.vectorstore.index_to_docstore_id[i] for i in range(self.vectorstore.index.ntotal)]
+            self.lexical_index = BM25Index.from_texts(ids, [self.vectorstore.docstore.search(doc_id).page_content for doc_id in ids])
+            lexical_missing = True
+
+        if manifest is None:
+            self.logger.info("No manifest found, building it from the docstore.")
+            for doc_id in self.vectorstore.index_to_docstore_id.values():
+                doc = self.vectorstore.docstore.search(doc_id)
+                if "parent_id" in doc.metadata:
+                    self.parents.setdefault(doc.metadata["parent_id"], []).append(doc_id)
+            self._save_manifest()
+
+        if self._needs_rebuild():
+            return False
+        self.set_search_params(self.index_params["nprobe"], self.index_params["ef_search"])
+        if self.storage_format == "columnar" and not is_columnar(self._base_path):
+            self.logger.info("Migrating vectorstore to the columnar format.")
+            return True
+        return lexical_missing
+
+    def _needs_rebuild(self) -> bool:
+        return (index_kind(self.vectorstore.index) != self.index_type
+                and self.vectorstore.index.ntotal >= min_training_points(self.index_type, self.index_params))
+
+    def set_search_params(self, nprobe: int = None, ef_search: int = None):
+        if nprobe is not None:
+            self.index_params["nprobe"] = nprobe
+        if ef_search is not None:
+            self.index_params["ef_search"] = ef_search
+        if self.vectorstore is not None:
+            set_search_params(self.vectorstore.index, nprobe=nprobe, ef_search=ef_search)
+
+    def _build_store(self, texts: List[str], embeddings, metadatas: List[Dict], ids: List[str]) -> FAISS:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        index_type = self.index_type
+        if len(vectors) < min_training_points(index_type, self.index_params):
+            self.logger.warning(f"Only {len(vectors)} vectors, too few to train {index_type}; building a flat index.")
+            index_type = "flat"
+        index = build_index(index_type, vectors, self.index_params)
+
+        recall = recall_against_flat(index, vectors, self.index_params["recall_k"], self.index_params["recall_queries"]) if index_type != "flat" else 1.0
+        self.build_report = {"index_type": index_type, "vectors": len(vectors), f"recall@{self.index_params['recall_k']}": recall}
+        self.logger.info(f"Built {index_type} index over {len(vectors)} vectors, recall@{self.index_params['recall_k']} vs flat: {recall:.4f}")
+
+        docs = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        return FAISS(
+            embedding_function=self.embedding_model,
+            index=index,
+            docstore=InMemoryDocstore(dict(zip(ids, docs))),
+            index_to_docstore_id=dict(enumerate(ids))
+        )
+
+    def rebuild_index(self):
+        with self._ingest_lock:
+            self._rebuild_index()
+
+    def _snapshot(self):
+        index = self._base_index if self._delta_index is not None else self.vectorstore.index
+        if index_kind(index) == "ivf_pq":
+            self.logger.warning("Rebuilding from an IVF-PQ index uses its quantized vectors, recall may drop.")
+        if isinstance(index, faiss.IndexIVF):
+            index.make_direct_map()
+        ids = [self.vectorstore.index_to_docstore_id[i] for i in range(self.vectorstore.index.ntotal)]
+        docs = [self.vectorstore.docstore.search(doc_id) for doc_id in ids]
+        vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.empty((0, index.d), dtype=np.float32)
+        if self._delta_index is not None and self._delta_index.ntotal:
+            vectors = np.vstack((vectors, self._delta_index.reconstruct_n(0, self._delta_index.ntotal)))
+        return ids, docs, vectors
+
+    def _rebuild_index(self, removed_parents: List[str] = ()):
+        if self.vectorstore is None:
+            return
+        with self.lock.write():
+            ids, docs, vectors = self._snapshot()
+        lexical_index = None
+        if removed_parents:
+            removed = {doc_id for parent_id in removed_parents for doc_id in self.parents.get(parent_id, [])}
+            keep = [i for i, doc_id in enumerate(ids) if doc_id not in removed]
+            self.logger.info(f"Removing {len(ids) - len(keep)} chunks of {len(removed_parents)} superseded documents.")
+            ids, docs, vectors = [ids[i] for i in keep], [docs[i] for i in keep], vectors[keep]
+            lexical_index = BM25Index.from_texts(ids, [doc.page_content for doc in docs])
+        self.logger.info(f"Rebuilding the index from {len(ids)} stored vectors.")
+        store = self._build_store([doc.page_content for doc in docs], vectors, [doc.metadata for doc in docs], ids)
+        with self.lock.write():
+            self.vectorstore = store
+            if lexical_index is not None:
+                self.lexical_index = lexical_index
+            for parent_id in removed_parents:
+                self.parents.pop(parent_id, None)
+            self._base_index, self._delta_index, self._mmapped = None, None, False
+            self._notify()
+        self._write_base()
+
+    def parents_of(self, source: str) -> List[str]:
+        self.load()
+        with self.lock.read():
+            first_docs = {parent_id: self.vectorstore.docstore.search(doc_ids[0]) for parent_id, doc_ids in self.parents.items() if doc_ids}
+        return [parent_id for parent_id, doc in first_docs.items() if isinstance(doc, Document) and doc.metadata.get("source") == source]
+
+    def remove_parents(self, parent_ids: List[str]):
+        self.load()
+        with self._ingest_lock:
+            parent_ids = [parent_id for parent_id in parent_ids if parent_id in self.parents]
+            if parent_ids:
+                self._rebuild_index(parent_ids)
+
+    def compact(self):
+        with self._ingest_lock:
+            self._compact()
+
+    def _compact(self):
+        if self.vectorstore is None or not self.deltas:
+            return
+        self.logger.info(f"Compacting {len(self.deltas)} deltas into the base vectorstore.")
+        if self._needs_rebuild():
+            self._rebuild_index()
+            return
+        self._write_base()
+
     def store_documents(self, chunks: List[Document]) -> FAISS:
         self.logger.info("Starting document storage process.")
+        self.load()
 
-        existing_ids = set()
-        vectorstore = None
+        with self._ingest_lock:
+            new_chunks = [c for c in chunks if c.metadata.get("parent_id") not in self.parents]
 
-        if Path(self.persist_directory).exists():
-            vectorstore = FAISS.load_local(self.persist_directory, self.embedding_model, allow_dangerous_deserialization=True)
-            self.logger.info("Loaded existing vectorstore from faiss_index.")
-            existing_ids = {
-                doc.metadata.get("parent_id")
-                for doc in vectorstore.docstore._dict.values()
-                if "parent_id" in doc.metadata
-            }
+            if not new_chunks:
+                self.logger.info("No new documents to embed. Skipping storage.")
+                return self.vectorstore
 
-        new_chunks = [c for c in chunks if c.metadata.get("parent_id") not in existing_ids]
+            texts = [c.page_content for c in new_chunks]
+            metadatas = [c.metadata for c in new_chunks]
+            ids = [c.metadata.get("chunk_id") or str(uuid.uuid4()) for c in new_chunks]
+            embeddings = self.embedding_model.embed_documents(texts)
 
-        if not new_chunks:
-            self.logger.info("No new documents to embed. Skipping storage.")
-            return vectorstore
+            new_parents: Dict[str, List[str]] = {}
+            for chunk, doc_id in zip(new_chunks, ids):
+                if "parent_id" in chunk.metadata:
+                    new_parents.setdefault(chunk.metadata["parent_id"], []).append(doc_id)
 
-        if vectorstore:
-            vectorstore.add_documents(new_chunks)
-        else:
-            vectorstore = FAISS.from_documents(new_chunks, self.embedding_model)
+            with self.metrics.span("index"):
+                store = None
+                lexical_delta = BM25Index.from_texts(ids, texts)
+                if self.vectorstore is None:
+                    store = self._build_store(texts, embeddings, metadatas, ids)
+                else:
+                    delta_name = f"delta_{uuid.uuid4().hex[:12]}"
+                    delta = FAISS.from_embeddings(zip(texts, embeddings), self.embedding_model, metadatas=metadatas, ids=ids)
+                    self._save_store(delta, self._delta_root / delta_name)
+                    lexical_delta.save(self._delta_root / delta_name)
+                    self._append_manifest_log(delta_name, new_parents)
+
+                with self.lock.write():
+                    for parent_id, doc_ids in new_parents.items():
+                        self.parents.setdefault(parent_id, []).extend(doc_ids)
+                    if store is not None:
+                        self.vectorstore, self.lexical_index = store, lexical_delta
+                    else:
+                        self._add_embeddings(texts, embeddings, metadatas, ids)
+                        self.lexical_index.merge(lexical_delta)
+                        self.deltas.append(delta_name)
+                    self._notify()
+                self.logger.info(f"Stored {len(new_chunks)} new document chunks in vectorstore.")
 
-        vectorstore.save_local(self.persist_directory)
-        self.logger.info(f"Stored {len(new_chunks)} new document chunks in vectorstore.")
-        return vectorstore
+            if store is not None:
+                self._write_base()
+            if len(self.deltas) >= self.compact_after:
+                self._compact()
+            return self.vectorstore
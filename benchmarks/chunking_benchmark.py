@@ -0,0 +1,95 @@
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import PyPDFLoader
+from backend.chunking import ChunkingOptions, chunk_sources
+from backend.document_handler import DocumentHandler
+
+MAGIC_RULES_URL = "https://media.wizards.com/images/magic/tcg/resources/rules/MagicCompRules_21031101.pdf"
+
+def legacy_chunk(pages: List[Document], source: str, chunk_size: int, chunk_overlap: int) -> List[Document]:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = splitter.split_documents(sorted(pages, key=lambda x: x.metadata.get("page", 0)))
+    for i, chunk in enumerate(chunks):
+        chunk.metadata.update({
+            "parent_id": source,
+            "parent_source": source,
+            "chunk_id": f"{source}_p{chunk.metadata.get('page', 0)}_c{i}",
+            "chunk_index": i,
+            "total_chunks": len(chunks)
+        })
+    return chunks
+
+def measure(run: Callable[[], List[Document]], repeats: int) -> Dict:
+    timings, chunks = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        chunks = run()
+        timings.append(time.perf_counter() - start)
+    return {"seconds": statistics.median(timings), "chunks": len(chunks)}
+
+def resolve_pdf(args) -> str:
+    if args.pdf:
+        return args.pdf
+    print(f"Fetching {args.url} ...", file=sys.stderr)
+    path, _ = DocumentHandler(folder=args.cache_folder)._download_pdf(args.url)
+    return path
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Chunking throughput benchmark.")
+    parser.add_argument("--pdf", help="Local PDF. Defaults to downloading the Magic Comprehensive Rules.")
+    parser.add_argument("--url", default=MAGIC_RULES_URL)
+    parser.add_argument("--cache-folder", default="documents")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=80)
+    parser.add_argument("--token-chunk-size", type=int, default=200)
+    parser.add_argument("--token-chunk-overlap", type=int, default=20)
+    parser.add_argument("--copies", type=int, default=4, help="Chunk this many copies as separate sources to measure parallel chunking.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    pdf_path = resolve_pdf(args)
+    start = time.perf_counter()
+    pages = PyPDFLoader(pdf_path).load()
+    parse_seconds = time.perf_counter() - start
+    page_tuples = [(page.metadata.get("page", 0), page.page_content) for page in pages]
+    chars = sum(len(text) for _, text in page_tuples)
+    print(f"Parsed {len(pages)} pages ({chars / 1e6:.2f}M chars) in {parse_seconds:.2f}s")
+
+    single = {"source": ("source", page_tuples)}
+    copies = {f"source_{i}": (f"source_{i}", page_tuples) for i in range(args.copies)}
+    chars_pages = ChunkingOptions(args.chunk_size, args.chunk_overlap, "chars", True)
+    chars_flow = ChunkingOptions(args.chunk_size, args.chunk_overlap, "chars", False)
+    tokens_pages = ChunkingOptions(args.token_chunk_size, args.token_chunk_overlap, "tokens", True)
+
+    cases = [
+        ("legacy split_documents", 1, lambda: legacy_chunk([Document(page_content=p.page_content, metadata=dict(p.metadata)) for p in pages],
+                                                           "source", args.chunk_size, args.chunk_overlap)),
+        ("chars, page-aware", 1, lambda: chunk_sources(single, chars_pages)),
+        ("chars, across pages", 1, lambda: chunk_sources(single, chars_flow)),
+        ("tokens, page-aware", 1, lambda: chunk_sources(single, tokens_pages)),
+        (f"legacy x{args.copies} sources", args.copies, lambda: [c for _ in range(args.copies) for c in legacy_chunk(
+            [Document(page_content=p.page_content, metadata=dict(p.metadata)) for p in pages], "source", args.chunk_size, args.chunk_overlap)]),
+        (f"chars x{args.copies} serial", args.copies, lambda: chunk_sources(copies, chars_pages, max_workers=1)),
+        (f"chars x{args.copies} parallel", args.copies, lambda: chunk_sources(copies, chars_pages, max_workers=args.workers, parallel_min_chars=0))
+    ]
+
+    print(f"{'case':<28} {'chunks':>8} {'seconds':>9} {'pages/s':>10} {'MB/s':>8}")
+    for name, multiplier, run in cases:
+        result = measure(run, args.repeats)
+        seconds = result["seconds"] or 1e-9
+        print(f"{name:<28} {result['chunks']:>8} {seconds:>9.3f} {len(pages) * multiplier / seconds:>10.0f} "
+              f"{chars * multiplier / seconds / 1e6:>8.2f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import re
+import time
+import zlib
+import threading
+import numpy as np
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from backend.cross_encoder import CrossEncoderScorer, DEFAULT_CROSS_ENCODER_MODEL, DEFAULT_BATCH_SIZE
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+def words(text: str) -> List[str]:
+    return _WORD_PATTERN.findall(text.lower())
+
+class StageTimer:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def total(self, stage: str) -> float:
+        with self._lock:
+            return sum(self.samples.get(stage, []))
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+
+class HashingEmbeddings(Embeddings):
+    def __init__(self, size: int = 256, latency_ms: float = 0.0, timer: StageTimer = None):
+        self.size = size
+        self.latency_ms = latency_ms
+        self.timer = timer
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in words(text):
+            vector[zlib.crc32(word.encode("utf-8")) % self.size] += 1.0
+        vector /= np.linalg.norm(vector) or 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        time.sleep(self.latency_ms / 1000)
+        vectors = [self._embed(text) for text in texts]
+        if self.timer is not None:
+            self.timer.record("embed", time.perf_counter() - start)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency_ms / 1000)
+        return self._embed(text)
+
+class EchoLLM(LLM):
+    latency_ms: float = 0.0
+    token_latency_ms: float = 0.0
+    answer_words: int = 40
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-echo"
+
+    def _answer(self, prompt: str) -> List[str]:
+        context = prompt.rsplit("Question:", 1)[0]
+        return words(context)[-self.answer_words:] or ["no", "answer"]
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        time.sleep((self.latency_ms + self.token_latency_ms * self.answer_words) / 1000)
+        return " ".join(self._answer(prompt))
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        time.sleep(self.latency_ms / 1000)
+        for i, word in enumerate(self._answer(prompt)):
+            time.sleep(self.token_latency_ms / 1000)
+            yield GenerationChunk(text=word if i == 0 else f" {word}")
+
+class OverlapScorer(CrossEncoderScorer):
+    def __init__(self, model_name: str = DEFAULT_CROSS_ENCODER_MODEL, batch_size: int = DEFAULT_BATCH_SIZE,
+                 latency_ms: float = 0.0, timer: StageTimer = None):
+        super().__init__(model_name, batch_size)
+        self.latency_ms = latency_ms
+        self.timer = timer
+
+    def score_pairs(self, pairs: Sequence[Tuple[str, str]]) -> List[float]:
+        start = time.perf_counter()
+        scores = []
+        for batch_start in range(0, len(pairs), self.batch_size):
+            time.sleep(self.latency_ms / 1000)
+            for query, text in pairs[batch_start:batch_start + self.batch_size]:
+                query_words, text_words = set(words(query)), set(words(text))
+                scores.append(len(query_words & text_words) / (len(query_words) or 1))
+        if self.timer is not None:
+            self.timer.record("rerank", time.perf_counter() - start)
+        return scores
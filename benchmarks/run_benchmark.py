@@ -0,0 +1,283 @@
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import itertools
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain.schema import Document
+from langchain_community.document_loaders import PyPDFLoader
+from backend.cross_encoder import DEFAULT_CROSS_ENCODER_MODEL, DEFAULT_BATCH_SIZE
+from backend.document_handler import DocumentHandler
+from backend.pipeline_config import PipelineConfig
+from backend.rag_pipeline import RAGPipeline
+from backend.resource_registry import ResourceRegistry
+from benchmarks.fakes import EchoLLM, HashingEmbeddings, OverlapScorer, StageTimer, words
+
+DEFAULT_QUESTIONS = Path(__file__).resolve().parent.parent / "notebooks" / "qa_eval.json"
+INGEST_STAGES = ("load", "chunk", "embed", "index")
+QUERY_STAGES = ("rewrite", "search", "rerank", "generate", "query")
+NOISE_FLOOR_MS = 1.0
+SYNTHETIC_SOURCE = "synthetic/answer_{}.pdf"
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    return {
+        "count": len(values),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99))
+    }
+
+def source_recall(relevant_source: str, docs: List[Document], k: int) -> float:
+    ranked_sources = list(dict.fromkeys(doc.metadata.get("source") for doc in docs))
+    return float(relevant_source in ranked_sources[:k])
+
+def context_overlap(ground_truth: str, docs: List[Document]) -> float:
+    expected = set(words(ground_truth))
+    if not expected:
+        return 1.0
+    retrieved = set(words(" ".join(doc.page_content for doc in docs)))
+    return len(expected & retrieved) / len(expected)
+
+def synthetic_corpus(qa_items: List[Dict], distractors: int, seed: int = 0) -> List[Document]:
+    rng = random.Random(seed)
+    filler_words = ["".join(rng.choice("bcdfghjklmnpqrstvwxz") + rng.choice("aeiou") for _ in range(3)) for _ in range(2000)]
+    question_words = sorted({w for item in qa_items for w in words(item["question"])})
+    filler = lambda n: " ".join(rng.choice(filler_words) for _ in range(n))
+    noisy = lambda n: " ".join(rng.choice(question_words) if rng.random() < 0.03 else rng.choice(filler_words) for _ in range(n))
+    pages = []
+    for i, item in enumerate(qa_items):
+        source = SYNTHETIC_SOURCE.format(i)
+        pages.append(Document(page_content=filler(300), metadata={"source": source, "page": 0}))
+        pages.append(Document(page_content=f"{filler(100)} {item['ground_truth']} {filler(100)}", metadata={"source": source, "page": 1}))
+    for i in range(distractors):
+        source = f"synthetic/distractor_{i}.pdf"
+        pages.extend(Document(page_content=noisy(400), metadata={"source": source, "page": page}) for page in range(3))
+    return pages
+
+def load_pages(pdfs: List[str], qa_items: List[Dict], distractors: int) -> List[Document]:
+    if not pdfs:
+        return synthetic_corpus(qa_items, distractors)
+    pages = []
+    for pdf in pdfs:
+        for page in PyPDFLoader(pdf).load():
+            page.metadata["source"] = pdf
+            pages.append(page)
+    return pages
+
+def build_configs(args) -> List[PipelineConfig]:
+    configs = []
+    for rerank, rewrite, mode, k, top_k in itertools.product(args.rerank, args.rewrite, args.retrieval_modes, args.retriever_k, args.top_k_chunks):
+        configs.append(PipelineConfig(
+            rewrite=rewrite,
+            retrieval_mode=mode,
+            use_reranking=rerank,
+            retriever_k=k,
+            top_k_chunks=top_k,
+            answer_cache=args.answer_cache
+        ))
+    return configs
+
+def config_name(chunk_size: int, config: PipelineConfig) -> str:
+    return (f"chunk{chunk_size}-{config.retrieval_mode}-k{config.retriever_k}-top{config.top_k_chunks}"
+            f"-rerank_{'on' if config.use_reranking else 'off'}-rewrite_{'on' if config.rewrite else 'off'}")
+
+def create_pipeline(workdir: Path, chunk_size: int, timer: StageTimer, args) -> RAGPipeline:
+    registry = ResourceRegistry()
+    registry.get("embedding_model", lambda: HashingEmbeddings(args.embedding_size, args.embed_latency_ms, timer))
+    registry.get("llm", lambda: EchoLLM(latency_ms=args.llm_latency_ms, token_latency_ms=args.token_latency_ms))
+    registry.get(("cross_encoder", DEFAULT_CROSS_ENCODER_MODEL, DEFAULT_BATCH_SIZE),
+                 lambda: OverlapScorer(latency_ms=args.rerank_latency_ms, timer=timer))
+    registry.get("doc_handler", lambda: DocumentHandler(folder=str(workdir / "documents")))
+    pipeline = RAGPipeline(index_type=args.index_type, persist_directory=str(workdir / f"faiss_chunk{chunk_size}"), registry=registry)
+
+    rewrite = pipeline.query_rewriter.rewrite
+    def timed_rewrite(question):
+        with timer.time("rewrite"):
+            return rewrite(question)
+    pipeline.query_rewriter.rewrite = timed_rewrite
+    return pipeline
+
+def ingest(pipeline: RAGPipeline, pages_loader, chunk_size: int, chunk_overlap: int, timer: StageTimer):
+    with timer.time("load"):
+        pages = pages_loader()
+    with timer.time("chunk"):
+        chunks = pipeline.doc_handler.load_and_chunk_pdfs(pages, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    embed_before = timer.total("embed")
+    start = time.perf_counter()
+    pipeline.vectorstore_manager.store_documents(chunks)
+    timer.record("index", time.perf_counter() - start - (timer.total("embed") - embed_before))
+    return len(chunks)
+
+def replay(pipeline: RAGPipeline, qa_items: List[Dict], repeats: int, timer: StageTimer, relevant_sources: Optional[List[str]]) -> Dict:
+    scores = []
+    for item in qa_items[:1]:
+        list(pipeline.stream_query(item["question"]))
+    timer.reset()
+
+    wall_start = time.perf_counter()
+    for _ in range(repeats):
+        for i, item in enumerate(qa_items):
+            rerank_before, rewrite_before = timer.total("rerank"), timer.total("rewrite")
+            start = time.perf_counter()
+            sources_at, docs = None, []
+            for event in pipeline.stream_query(item["question"]):
+                if event["type"] == "sources":
+                    sources_at, docs = time.perf_counter(), event["documents"]
+            end = time.perf_counter()
+            sources_at = sources_at or end
+            retrieval = sources_at - start - (timer.total("rerank") - rerank_before) - (timer.total("rewrite") - rewrite_before)
+            timer.record("search", retrieval)
+            timer.record("generate", end - sources_at)
+            timer.record("query", end - start)
+            if relevant_sources is None:
+                scores.append(context_overlap(item["ground_truth"], docs))
+            else:
+                scores.append(source_recall(relevant_sources[i], docs, pipeline.config.retriever_k))
+    wall = time.perf_counter() - wall_start
+    return {"throughput_qps": len(scores) / wall if wall else 0.0, "score": float(np.mean(scores)) if scores else 0.0}
+
+def run_config(workdir: str, chunk_size: int, config: PipelineConfig, qa_items: List[Dict], args) -> Dict:
+    timer = StageTimer()
+    pipeline = create_pipeline(Path(workdir), chunk_size, timer, args)
+    pipeline.configure(config)
+    timer.reset()
+    relevant_sources = None if args.pdf else [SYNTHETIC_SOURCE.format(i) for i in range(len(qa_items))]
+    stats = replay(pipeline, qa_items, args.repeats, timer, relevant_sources)
+    stats["latency_ms"] = {stage: summarize(timer.samples[stage]) for stage in QUERY_STAGES if timer.samples.get(stage)}
+    stats["peak_rss_mb"] = peak_rss_mb()
+    return stats
+
+def run(args) -> Dict:
+    qa_items = json.loads(Path(args.questions).read_text(encoding="utf-8"))
+    if args.limit:
+        qa_items = qa_items[:args.limit]
+    configs = build_configs(args)
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="rag_bench_") as tmp:
+        for chunk_size in args.chunk_sizes:
+            timer = StageTimer()
+            pipeline = create_pipeline(Path(tmp), chunk_size, timer, args)
+            chunk_count = ingest(pipeline, lambda: load_pages(args.pdf, qa_items, args.distractors), chunk_size, args.chunk_overlap, timer)
+            ingest_latency = {stage: summarize(timer.samples[stage]) for stage in INGEST_STAGES if timer.samples.get(stage)}
+
+            del pipeline
+
+            for config in configs:
+                name = config_name(chunk_size, config)
+                print(f"Running {name} ...", file=sys.stderr)
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    stats = executor.submit(run_config, tmp, chunk_size, config, qa_items, args).result()
+                latency = dict(ingest_latency)
+                latency.update(stats["latency_ms"])
+                results.append({
+                    "name": name,
+                    "chunk_size": chunk_size,
+                    "chunks": chunk_count,
+                    "config": asdict(config),
+                    "latency_ms": latency,
+                    "throughput_qps": stats["throughput_qps"],
+                    "context_overlap" if args.pdf else f"recall@{config.retriever_k}": stats["score"],
+                    "peak_rss_mb": stats["peak_rss_mb"]
+                })
+    return {"questions": len(qa_items), "repeats": args.repeats, "results": results}
+
+def find_regressions(report: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    previous = {result["name"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get(result["name"])
+        if old is None:
+            continue
+        for stage, stats in result["latency_ms"].items():
+            old_p95 = old["latency_ms"].get(stage, {}).get("p95")
+            if old_p95 is None:
+                continue
+            if stats["p95"] > old_p95 * (1 + max_regression) and stats["p95"] - old_p95 > NOISE_FLOOR_MS:
+                regressions.append(f"{result['name']} {stage}: p95 {old_p95:.1f}ms -> {stats['p95']:.1f}ms")
+    return regressions
+
+def _quality(result: Dict):
+    return next((key, value) for key, value in result.items() if key.startswith("recall@") or key == "context_overlap")
+
+def print_table(report: Dict):
+    label = "overlap" if report["results"] and _quality(report["results"][0])[0] == "context_overlap" else "recall"
+    header = f"{'config':<60} {'query p50':>10} {'query p95':>10} {'query p99':>10} {'search p95':>11} {'rerank p95':>11} {'gen p95':>8} {'qps':>8} {label:>7} {'rss MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for result in report["results"]:
+        latency = result["latency_ms"]
+        p = lambda stage, q: latency.get(stage, {}).get(q, 0.0)
+        quality = _quality(result)[1]
+        rss = result["peak_rss_mb"] or 0.0
+        print(f"{result['name']:<60} {p('query', 'p50'):>10.2f} {p('query', 'p95'):>10.2f} {p('query', 'p99'):>10.2f} "
+              f"{p('search', 'p95'):>11.2f} {p('rerank', 'p95'):>11.2f} {p('generate', 'p95'):>8.2f} "
+              f"{result['throughput_qps']:>8.2f} {quality:>7.3f} {rss:>8.1f}")
+
+def parse_flags(value: str) -> List[bool]:
+    return [flag.strip().lower() in ("1", "on", "true", "yes") for flag in value.split(",")]
+
+def parse_ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",")]
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline latency and recall benchmark for RAGPipeline.")
+    parser.add_argument("--questions", default=str(DEFAULT_QUESTIONS), help="JSON list of {question, ground_truth}.")
+    parser.add_argument("--pdf", nargs="*", default=[], help="Local PDFs to index. Defaults to a synthetic corpus built from the questions.")
+    parser.add_argument("--limit", type=int, default=0, help="Only use the first N questions.")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--distractors", type=int, default=50, help="Distractor documents in the synthetic corpus.")
+    parser.add_argument("--rerank", type=parse_flags, default=[False, True], help="Comma-separated on/off values.")
+    parser.add_argument("--rewrite", type=parse_flags, default=[False], help="Comma-separated on/off values.")
+    parser.add_argument("--retrieval-modes", type=lambda v: v.split(","), default=["dense"])
+    parser.add_argument("--retriever-k", type=parse_ints, default=[4])
+    parser.add_argument("--top-k-chunks", type=parse_ints, default=[20])
+    parser.add_argument("--chunk-sizes", type=parse_ints, default=[800])
+    parser.add_argument("--chunk-overlap", type=int, default=80)
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the answer cache enabled while replaying.")
+    parser.add_argument("--embedding-size", type=int, default=256)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--rerank-latency-ms", type=float, default=0.0, help="Simulated cross-encoder latency per batch.")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0)
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    parser.add_argument("--baseline", help="Compare p95 latencies against a previous JSON report.")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed relative p95 increase before failing.")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_table(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.baseline:
+        regressions = find_regressions(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,12 +23,16 @@ class PromptManager:
             template = template.replace("{role}", role)
         return PromptTemplate.from_template(template)
 
-    def rewrite_query(self, original_query: str, llm, retriever) -> str:
-        relevant_docs = retriever.get_relevant_documents(original_query)
-        context = "\n---\n".join(doc.page_content for doc in relevant_docs[:3]) if relevant_docs else ""
-        template = self.prompts["rewrite"]
-        prompt = PromptTemplate.from_template(template)
-        chain = prompt | llm
-        response = chain.invoke({"question": original_query, "context": context})
+    def _rewrite_inputs(self, original_query: str, context_docs) -> dict:
+        context = "\n---\n".join(doc.page_content for doc in context_docs) if context_docs else ""
+        return {"question": original_query, "context": context}
+
+    def rewrite_query(self, original_query: str, llm, context_docs=None) -> str:
+        chain = self.get_prompt("rewrite") | llm
+        response = chain.invoke(self._rewrite_inputs(original_query, context_docs))
         return response.content if hasattr(response, "content") else str(response)
 
+    async def arewrite_query(self, original_query: str, llm, context_docs=None) -> str:
+        chain = self.get_prompt("rewrite") | llm
+        response = await chain.ainvoke(self._rewrite_inputs(original_query, context_docs))
+        return response.content if hasattr(response, "content") else str(response)
@@ -4,10 +4,13 @@ import streamlit as st
 from pathlib import Path
 from dotenv import load_dotenv, set_key
 from backend.rag_pipeline import RAGPipeline
+from backend.pipeline_config import PipelineConfig
 set_key(".env", "STREAMLIT_WATCH_USE_POLLING", "true")
 load_dotenv()
 st.set_page_config(page_title="RAG Chat Assistant", page_icon="🧠", layout="wide")
 
+ANSWER_INSTRUCTION = "Answer only with the content of the documents - otherwise say 'Answer not included in the documents'"
+
 def init_session_state():
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
@@ -21,28 +24,42 @@ def init_session_state():
     if "pipeline" not in st.session_state:
         with st.spinner("🔄 Initializing RAG system... Please wait, this might take up to few minutes :)"):
             st.session_state.pipeline = RAGPipeline()
-            st.session_state.pipeline.load_documents(st.session_state.pdf_links)
-            st.session_state.pipeline.set_memory(True)
-            st.session_state.pipeline.set_prompt_type("zero_shot", "Answer only with the content of the documents - otherwise say 'Answer not included in the documents'")
-            st.session_state.pipeline.set_query_rewriting(False)
-            st.session_state.pipeline.set_use_reranker(False)
-            st.session_state.chain = st.session_state.pipeline.get_chain()
+            progress = st.progress(0.0, text="Fetching documents...")
+            def on_progress(stage, url, completed, total):
+                progress.progress(completed / total, text=f"{stage.capitalize()} {Path(url).name} ({completed}/{total})")
+            failures = st.session_state.pipeline.load_documents(st.session_state.pdf_links, progress_callback=on_progress)
+            progress.empty()
+            for url, error in failures.items():
+                st.warning(f"⚠️ Could not load {url}: {error}")
+            st.session_state.pipeline.set_memory(True, mode="summary")
+            st.session_state.pipeline.configure(PipelineConfig(additional_instruction=ANSWER_INSTRUCTION))
+            st.session_state.pipeline.warm_up(background=True)
 
 def render_sidebar():
     st.image("https://cdn-icons-png.flaticon.com/512/9195/9195256.png", width=200)
     st.markdown("### ⚙️ RAG Configuration")
 
     query_rewriting = st.checkbox("Rewrite query", value=False)
+    rewrite_fusion = st.checkbox("Fuse original and rewritten results", value=False, disabled=not query_rewriting)
     prompt_type = st.selectbox(
         "Prompt Strategy",
         options=["zero_shot", "cot", "react", "explain_like_5", "elaborate", "meta"],
     )
+    hybrid = st.checkbox("Hybrid search (BM25 + vector)", value=False)
+    memory_tokens = st.slider("Memory size (tokens)", min_value=250, max_value=4000, value=1000, step=250)
     use_reranker = st.checkbox("Use Reranker", value=False)
-
-    st.session_state.pipeline.set_prompt_type(prompt_type, "Answer only with the content of the documents - otherwise say 'Answer not included in the documents'")
-    st.session_state.pipeline.set_query_rewriting(query_rewriting)
-    st.session_state.pipeline.set_use_reranker(use_reranker)
-    st.session_state.chain = st.session_state.pipeline.get_chain()
+    rerank_mode = st.selectbox("Rerank granularity", options=["parent", "chunk", "window"], disabled=not use_reranker)
+
+    st.session_state.pipeline.configure(PipelineConfig(
+        prompt_type=prompt_type,
+        additional_instruction=ANSWER_INSTRUCTION,
+        rewrite=query_rewriting,
+        rewrite_fusion=query_rewriting and rewrite_fusion,
+        retrieval_mode="hybrid" if hybrid else "dense",
+        use_reranking=use_reranker,
+        rerank_mode=rerank_mode
+    ))
+    st.session_state.pipeline.set_memory(True, mode="summary", max_token_limit=memory_tokens)
     
     st.markdown("---")
     st.markdown("### 📄 Add PDF from URL")
@@ -54,7 +71,7 @@ def render_sidebar():
             with st.spinner("📄 Indexing your PDF... Please wait."):
                 st.session_state.pdf_links.append(user_pdf_url)
                 st.cache_resource.clear()
-                st.session_state.pipeline.load_documents(st.session_state.pdf_links)
+                st.session_state.pipeline.load_documents([user_pdf_url])
             st.success("✅ PDF added and indexed!")
             st.rerun()
         else:
@@ -77,10 +94,18 @@ def handle_query(query):
             st.markdown(f"<div class='chat-message-user'>🗣️{query}</div>", unsafe_allow_html=True)
 
         with st.chat_message("assistant"):
-            chain = st.session_state.chain 
-            result = chain({"question": query})
-            answer = result.get("answer", "🤔 I couldn't find a good answer.")
-            st.markdown(f"<div class='chat-message-assistant'>🤖 {answer}</div>", unsafe_allow_html=True)
+            placeholder = st.empty()
+            streamed, result = "", {}
+            for event in st.session_state.pipeline.stream_query(query):
+                if event["type"] == "token":
+                    streamed += event["text"]
+                    placeholder.markdown(f"<div class='chat-message-assistant'>🤖 {streamed}▌</div>", unsafe_allow_html=True)
+                elif event["type"] == "answer":
+                    result = event
+            answer = result.get("answer") or "🤔 I couldn't find a good answer."
+            placeholder.markdown(f"<div class='chat-message-assistant'>🤖 {answer}</div>", unsafe_allow_html=True)
+            if result.get("cached"):
+                st.caption("⚡ Answered from cache")
             st.session_state.chat_history.append((query, answer))
 
             with st.expander("Sources", expanded=False):
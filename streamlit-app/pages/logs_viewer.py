@@ -1,21 +1,33 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 import streamlit as st
 from pathlib import Path
+from backend.logging import LOG_PATH, read_log_tail
 
 st.set_page_config(page_title="📜 RAG Logs", page_icon="📄", layout="wide")
 
 st.title("📜 Application Logs")
-log_file = Path("logs\\app.log")
+log_file = Path(LOG_PATH)
 marker = "STARTING RAG PIPELINE"
+max_kb = st.slider("Tail size (KB)", min_value=64, max_value=4096, value=512, step=64)
 
 if log_file.exists():
-    logs = log_file.read_text(encoding="utf-8", errors="replace")
+    if st.session_state.get("log_tail_kb") != max_kb:
+        st.session_state.log_tail_kb = max_kb
+        st.session_state.log_tail, st.session_state.log_offset = read_log_tail(max_kb * 1024)
+    else:
+        new_text, st.session_state.log_offset = read_log_tail(max_kb * 1024, st.session_state.log_offset)
+        st.session_state.log_tail = (st.session_state.log_tail + new_text)[-max_kb * 1024:]
+
+    logs = st.session_state.log_tail
     last_index = logs.rfind(marker)
     if last_index != -1:
         logs = logs[last_index:]
     else:
-        logs = "⚠️ Marker not found in logs."
+        st.info(f"Marker not found in the last {max_kb} KB, showing the tail of the log.")
 
     st.text_area("Log Output (from last pipeline start)", logs.strip(), height=600, key="log_output", disabled=True)
-    st.download_button("📥 Download Log File", logs, file_name="app.log")
+    st.button("🔄 Refresh")
+    st.download_button("📥 Download Log Tail", logs, file_name="app.log")
 else:
     st.warning(f"⚠️ Log file not found at: {log_file}")
\ No newline at end of file
@@ -0,0 +1,62 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+import time
+import json
+import pandas as pd
+import streamlit as st
+from backend.metrics import STAGE_METRIC, get_metrics
+
+st.set_page_config(page_title="📈 RAG Metrics", page_icon="📈", layout="wide")
+
+st.title("📈 Pipeline Metrics")
+metrics = get_metrics()
+snapshot = metrics.export_json()
+
+st.markdown("### ⏱️ Stage latency")
+stages = [
+    {
+        "stage": histogram["labels"].get("stage"),
+        **{key: value for key, value in histogram["labels"].items() if key != "stage"},
+        "count": histogram["count"],
+        "p50 (ms)": histogram["p50"] * 1000,
+        "p95 (ms)": histogram["p95"] * 1000,
+        "p99 (ms)": histogram["p99"] * 1000,
+        "total (s)": histogram["sum"]
+    }
+    for histogram in snapshot["histograms"] if histogram["name"] == STAGE_METRIC
+]
+if stages:
+    st.dataframe(pd.DataFrame(stages).sort_values("stage"), use_container_width=True, hide_index=True)
+else:
+    st.info("No spans recorded yet. Ask a question or load documents first.")
+
+other_histograms = [histogram for histogram in snapshot["histograms"] if histogram["name"] != STAGE_METRIC]
+if other_histograms:
+    st.dataframe(pd.DataFrame([
+        {"metric": h["name"], "count": h["count"], "p50 (ms)": h["p50"] * 1000, "p95 (ms)": h["p95"] * 1000, "p99 (ms)": h["p99"] * 1000}
+        for h in other_histograms
+    ]), use_container_width=True, hide_index=True)
+
+st.markdown("### 🔢 Counters")
+if snapshot["counters"]:
+    st.dataframe(pd.DataFrame([
+        {"metric": counter["name"], "labels": ", ".join(f"{k}={v}" for k, v in counter["labels"].items()), "value": counter["value"]}
+        for counter in snapshot["counters"]
+    ]), use_container_width=True, hide_index=True)
+
+if "pipeline" in st.session_state:
+    st.markdown("### ⚡ Answer cache")
+    st.json(st.session_state.pipeline.answer_cache.stats())
+
+st.markdown("### 🧵 Recent spans")
+spans = metrics.recent_spans(50)
+if spans:
+    st.dataframe(pd.DataFrame([
+        {"time": time.strftime("%H:%M:%S", time.localtime(span["end"])), "stage": span["stage"], "ms": span["seconds"] * 1000}
+        for span in spans
+    ]), use_container_width=True, hide_index=True)
+
+col1, col2, col3 = st.columns(3)
+col1.button("🔄 Refresh")
+col2.download_button("📥 Prometheus metrics", metrics.export_prometheus(), file_name="metrics.prom")
+col3.download_button("📥 JSON metrics", json.dumps(snapshot, indent=2), file_name="metrics.json")
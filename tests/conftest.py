@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import backend.logging as backend_logging
+
+backend_logging.LOG_DIR = tempfile.mkdtemp(prefix="rag-test-logs-")
+backend_logging.LOG_PATH = os.path.join(backend_logging.LOG_DIR, "app.log")
+
+import pytest
+from langchain.schema import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake import FakeListLLM
+from backend.document_handler import DocumentHandler
+from backend.embedding_stage import CachedEmbeddings
+from backend.resource_registry import ResourceRegistry
+
+def make_docs(count: int = 40):
+    return [
+        Document(
+            page_content=f"haste lets a creature attack {i}" if i % 3 == 0 else f"monopoly hotel rule {i}",
+            metadata={"parent_id": f"p{i % 4}", "parent_source": f"p{i % 4}.pdf", "chunk_id": f"c{i}", "page": i}
+        )
+        for i in range(count)
+    ]
+
+@pytest.fixture
+def make_pipeline(tmp_path):
+    from backend.rag_pipeline import RAGPipeline
+
+    def build(config=None, docs=None):
+        registry = ResourceRegistry()
+        registry.get("embedding_model", lambda: CachedEmbeddings(DeterministicFakeEmbedding(size=16), cache_folder=str(tmp_path / "embeddings")))
+        registry.get("doc_handler", lambda: DocumentHandler(folder=str(tmp_path / "documents")))
+        registry.get("llm", lambda: FakeListLLM(responses=[f"answer {i}" for i in range(1000)]))
+        pipeline = RAGPipeline(persist_directory=str(tmp_path / "index"), registry=registry, config=config)
+        pipeline.vectorstore_manager.store_documents(make_docs() if docs is None else docs)
+        return pipeline
+    return build
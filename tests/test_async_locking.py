@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import time
+from dataclasses import replace
+from backend.pipeline_config import PipelineConfig
+
+def _run_with_timeout(target, timeout: float = 30.0):
+    errors = []
+    def run():
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "event loop deadlocked"
+    assert not errors, errors
+
+def _concurrent_aqueries_during_writes(pipeline, questions):
+    lock = pipeline.vectorstore_manager.lock
+    stop = threading.Event()
+
+    def writer():
+        while not stop.is_set():
+            with lock.write():
+                time.sleep(0.005)
+            time.sleep(0.001)
+
+    async def queries():
+        return await asyncio.gather(*(pipeline.aquery(question) for question in questions))
+
+    writer_thread = threading.Thread(target=writer, daemon=True)
+    writer_thread.start()
+    try:
+        results = []
+        _run_with_timeout(lambda: results.extend(asyncio.run(queries())))
+    finally:
+        stop.set()
+        writer_thread.join(5)
+    assert len(results) == len(questions)
+    assert all(result["answer"] for result in results)
+
+def test_concurrent_aquery_during_write_does_not_deadlock(make_pipeline):
+    pipeline = make_pipeline(PipelineConfig(answer_cache=False))
+    _concurrent_aqueries_during_writes(pipeline, [f"does haste let creature {i} attack" for i in range(16)])
+
+def test_concurrent_aquery_with_reranking_during_write(make_pipeline):
+    pipeline = make_pipeline(PipelineConfig(answer_cache=False))
+    pipeline.cross_encoder.score_pairs = lambda pairs: [float(len(text)) for _, text in pairs]
+    pipeline.configure(replace(pipeline.config, use_reranking=True, retrieval_mode="hybrid"))
+    _concurrent_aqueries_during_writes(pipeline, [f"monopoly hotel rule {i}" for i in range(16)])
+
+def test_concurrent_arewrite_during_write(make_pipeline):
+    pipeline = make_pipeline(PipelineConfig(answer_cache=False))
+    pipeline.configure(replace(pipeline.config, rewrite=True, rewrite_fusion=True))
+    _concurrent_aqueries_during_writes(pipeline, [f"what does haste do for creature {i}" for i in range(16)])
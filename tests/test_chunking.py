@@ -0,0 +1,34 @@
+import json
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from backend.chunking import ChunkingOptions, chunk_pages, to_documents
+from backend.columnar_store import METADATA_FILE, PARENT_METADATA_FILE, load_columnar
+from backend.document_cache import DocumentCache
+from backend.vectorstore_manager import VectorstoreManager
+
+PAGES = [(page, " ".join(f"rule {page}.{i} says a creature with haste can attack." for i in range(60))) for page in range(3)]
+
+def _chunks(parent_id: str = "rules_abc", source: str = "https://example.com/rules.pdf"):
+    records = chunk_pages(PAGES, parent_id, ChunkingOptions(chunk_size=300, chunk_overlap=30))
+    return records, to_documents(records, parent_id, source)
+
+def test_chunk_cache_stores_records_and_rebuilds_documents(tmp_path):
+    records, docs = _chunks()
+    cache = DocumentCache(str(tmp_path))
+    cache.save_chunks("hash", "variant", "rules_abc", "https://example.com/rules.pdf", records)
+
+    loaded = cache.load_chunks("hash", "variant")
+    assert [(doc.id, doc.page_content, doc.metadata) for doc in loaded] == [(doc.id, doc.page_content, doc.metadata) for doc in docs]
+    with open(cache._chunks_path("hash", "variant"), "r", encoding="utf-8") as f:
+        assert f.read().count("example.com") == 1
+
+def test_columnar_store_keeps_per_parent_metadata_once(tmp_path):
+    records, docs = _chunks()
+    other_records, other_docs = _chunks("other_def", "https://example.com/other.pdf")
+    manager = VectorstoreManager(DeterministicFakeEmbedding(size=16), str(tmp_path))
+    manager.store_documents(docs + other_docs)
+
+    store = load_columnar(manager._base_path, manager.embedding_model)
+    assert {doc.id: doc.metadata for doc in docs + other_docs} == {doc_id: doc.metadata for doc_id, doc in store.docstore.items()}
+    rows = (manager._base_path / METADATA_FILE).read_text(encoding="utf-8")
+    assert "example.com" not in rows and "total_chunks" not in rows
+    assert json.loads((manager._base_path / PARENT_METADATA_FILE).read_text(encoding="utf-8"))["rules_abc"]["total_chunks"] == len(records)
@@ -0,0 +1,15 @@
+import requests
+
+def test_load_documents_returns_the_failures_of_each_call(make_pipeline):
+    pipeline = make_pipeline()
+
+    def download(url):
+        raise requests.ConnectionError(f"{url} is down")
+    pipeline.doc_handler._download_pdf = download
+
+    first = pipeline.load_documents(["https://a.example/rules.pdf"])
+    second = pipeline.load_documents(["https://b.example/rules.pdf"])
+    assert first == {"https://a.example/rules.pdf": "https://a.example/rules.pdf is down"}
+    assert second == {"https://b.example/rules.pdf": "https://b.example/rules.pdf is down"}
+    assert not pipeline.loaded_urls
+    assert not hasattr(pipeline.doc_handler, "failed_urls")
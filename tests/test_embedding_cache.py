@@ -0,0 +1,68 @@
+import multiprocessing
+import numpy as np
+from backend.embedding_stage import EmbeddingCache, text_hash
+
+DIM = 8
+
+def _vector(key: str) -> np.ndarray:
+    return np.frombuffer(bytes.fromhex(text_hash(key)[:DIM * 8]), dtype=np.uint32).astype(np.float32)
+
+def _writer(folder: str, worker: int, batches: int):
+    cache = EmbeddingCache(folder, "model")
+    for batch in range(batches):
+        keys = [f"{worker}-{batch}-{i}" for i in range(5)]
+        cache.put(keys, np.stack([_vector(key) for key in keys]))
+
+def test_cache_round_trip_is_memory_mapped_and_lazy(tmp_path):
+    keys = [f"k{i}" for i in range(10)]
+    EmbeddingCache(str(tmp_path), "model").put(keys, np.stack([_vector(key) for key in keys]))
+
+    cache = EmbeddingCache(str(tmp_path), "model")
+    assert not cache._loaded
+    found = cache.get(keys)
+    assert isinstance(cache._matrix, np.memmap)
+    assert all(np.array_equal(found[key], _vector(key)) for key in keys)
+
+def test_concurrent_process_appends_keep_keys_and_rows_aligned(tmp_path):
+    workers, batches = 4, 40
+    processes = [multiprocessing.Process(target=_writer, args=(str(tmp_path), worker, batches)) for worker in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    cache = EmbeddingCache(str(tmp_path), "model")
+    keys = [f"{worker}-{batch}-{i}" for worker in range(workers) for batch in range(batches) for i in range(5)]
+    found = cache.get(keys)
+    assert len(found) == len(keys)
+    assert all(np.array_equal(found[key], _vector(key)) for key in keys)
+
+def test_put_remaps_the_file_instead_of_keeping_vectors_in_memory(tmp_path):
+    cache, other = EmbeddingCache(str(tmp_path), "model"), EmbeddingCache(str(tmp_path), "model")
+    for owner, keys in ((cache, ["a", "b"]), (other, ["c"]), (cache, ["d"])):
+        owner.put(keys, np.stack([_vector(key) for key in keys]))
+
+    assert isinstance(cache._matrix, np.memmap) and cache._matrix.shape == (4, DIM)
+    assert cache._rows == {"a": 0, "b": 1, "c": 2, "d": 3}
+    assert all(np.array_equal(vector, _vector(key)) for key, vector in cache.get(["a", "b", "c", "d"]).items())
+
+def test_truncated_tail_is_repaired(tmp_path):
+    keys = [f"k{i}" for i in range(4)]
+    cache = EmbeddingCache(str(tmp_path), "model")
+    cache.put(keys, np.stack([_vector(key) for key in keys]))
+    with open(cache.vectors_path, "ab") as f:
+        f.write(b"\0" * 6)
+
+    reloaded = EmbeddingCache(str(tmp_path), "model")
+    assert len(reloaded) == 4
+    assert all(np.array_equal(vector, _vector(key)) for key, vector in reloaded.get(keys).items())
+
+def test_batch_retrieval_does_not_cache_query_vectors(make_pipeline):
+    pipeline = make_pipeline()
+    cache = pipeline.embedding_model.cache
+    cached = len(cache)
+    questions = [f"unseen question {i} about hotels" for i in range(5)]
+    batched = pipeline.retrieve_batch(questions)
+    assert len(batched) == 5 and all(batched)
+    assert len(cache) == cached
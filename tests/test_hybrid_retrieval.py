@@ -0,0 +1,34 @@
+import pytest
+from backend.lexical_index import BM25Index
+from backend.pipeline_config import PipelineConfig
+
+def test_unknown_terms_have_no_postings(tmp_path):
+    BM25Index.from_texts(["a", "b"], ["monopoly hotel", "haste creature"]).save(tmp_path)
+    index = BM25Index.load(tmp_path)
+    index.add(["c"], ["hotel rule"])
+    assert index.search("zyzzyva", k=3) == []
+    assert sorted(doc_id for doc_id, _ in index.search("zyzzyva hotel", k=3)) == ["a", "c"]
+
+@pytest.mark.parametrize("use_reranking", [False, True])
+def test_hybrid_queries_with_out_of_vocabulary_terms(make_pipeline, use_reranking):
+    pipeline = make_pipeline(PipelineConfig(answer_cache=False, retrieval_mode="hybrid", use_reranking=use_reranking))
+    if use_reranking:
+        pipeline.cross_encoder.score_pairs = lambda pairs: [float(len(text)) for _, text in pairs]
+
+    assert pipeline.query("zyzzyva quux")["source_documents"]
+    assert pipeline.query("zyzzyva hotel")["source_documents"]
+    assert all(pipeline.retrieve_batch(["zyzzyva quux", "hotel zyzzyva"]))
+
+def test_documents_added_after_a_compaction_are_found_lexically(make_pipeline):
+    from langchain.schema import Document
+    pipeline = make_pipeline(PipelineConfig(answer_cache=False, retrieval_mode="hybrid"))
+    pipeline.query("monopoly hotel rule")
+    manager = pipeline.vectorstore_manager
+    manager.compact_after = 1
+    before = manager.lexical_index
+
+    manager.store_documents([Document(page_content="xylophone tournament rules", metadata={"parent_id": "new", "chunk_id": "new-0"})])
+    assert manager.lexical_index is not before
+    docs = pipeline.query("xylophone")["source_documents"]
+    assert "new-0" in [doc.metadata["chunk_id"] for doc in docs]
+    assert pipeline.retriever.lexical_index is manager.lexical_index
@@ -0,0 +1,31 @@
+import pytest
+from backend.pipeline_config import PipelineConfig
+
+def _stored_metadata(vectorstore):
+    return [vectorstore.docstore.search(doc_id).metadata for doc_id in vectorstore.index_to_docstore_id.values()]
+
+@pytest.mark.parametrize("rerank_mode", ["parent", "chunk", "window"])
+def test_rerank_does_not_annotate_shared_docstore(make_pipeline, rerank_mode):
+    pipeline = make_pipeline(PipelineConfig(answer_cache=False, use_reranking=True, rerank_mode=rerank_mode))
+    pipeline.cross_encoder.score_pairs = lambda pairs: [float(len(set(q.split()) & set(t.split()))) for q, t in pairs]
+
+    docs = pipeline.query("does haste let a creature attack")["source_documents"]
+
+    assert docs and all("rerank_score" in doc.metadata for doc in docs)
+    if rerank_mode != "parent":
+        for parent_id in {doc.metadata["parent_id"] for doc in docs}:
+            scores = [doc.metadata["chunk_rerank_score"] for doc in docs if doc.metadata["parent_id"] == parent_id]
+            assert scores == sorted(scores, reverse=True)
+    assert not any("rerank_score" in metadata or "chunk_rerank_score" in metadata for metadata in _stored_metadata(pipeline.vectorstore))
+
+def test_rerank_scores_are_not_persisted_by_compaction(make_pipeline, tmp_path):
+    pipeline = make_pipeline(PipelineConfig(answer_cache=False, use_reranking=True, rerank_mode="chunk"))
+    pipeline.cross_encoder.score_pairs = lambda pairs: [float(len(text)) for _, text in pairs]
+    pipeline.query("monopoly hotel rule")
+
+    manager = pipeline.vectorstore_manager
+    manager._write_base()
+
+    from backend.vectorstore_manager import VectorstoreManager
+    reloaded = VectorstoreManager(manager.embedding_model, manager.persist_directory)
+    assert not any("rerank_score" in metadata for metadata in _stored_metadata(reloaded.load()))
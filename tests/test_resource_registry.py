@@ -0,0 +1,117 @@
+import threading
+import time
+from langchain.schema import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from backend.resource_registry import ReadWriteLock, ResourceRegistry
+from backend.vectorstore_manager import VectorstoreManager
+
+class GatedEmbeddings(Embeddings):
+    def __init__(self, size: int):
+        self.embeddings = DeterministicFakeEmbedding(size=size)
+        self.embedding = threading.Event()
+        self.release = threading.Event()
+        self.gated = False
+
+    def embed_documents(self, texts):
+        if self.gated:
+            self.embedding.set()
+            self.release.wait(10)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+def _start(target) -> threading.Thread:
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+def test_waiting_writer_blocks_new_readers():
+    lock = ReadWriteLock()
+    order, reader_holding, release_reader = [], threading.Event(), threading.Event()
+
+    def first_reader():
+        with lock.read():
+            reader_holding.set()
+            release_reader.wait(10)
+
+    def writer():
+        with lock.write():
+            order.append("writer")
+
+    def late_reader():
+        with lock.read():
+            order.append("reader")
+
+    _start(first_reader)
+    assert reader_holding.wait(10)
+    writer_thread = _start(writer)
+    while not lock._waiting_writers:
+        time.sleep(0.001)
+    late_thread = _start(late_reader)
+    time.sleep(0.1)
+    assert order == [], "a new reader overtook the waiting writer"
+
+    release_reader.set()
+    writer_thread.join(10)
+    late_thread.join(10)
+    assert order == ["writer", "reader"]
+
+def test_readers_are_not_blocked_while_new_chunks_embed(tmp_path):
+    embeddings = GatedEmbeddings(size=16)
+    manager = VectorstoreManager(embeddings, str(tmp_path))
+    manager.store_documents([Document(page_content=f"base {i}", metadata={"parent_id": "a", "chunk_id": f"a{i}"}) for i in range(5)])
+
+    embeddings.gated = True
+    ingest = _start(lambda: manager.store_documents(
+        [Document(page_content=f"new {i}", metadata={"parent_id": "b", "chunk_id": f"b{i}"}) for i in range(5)]
+    ))
+    assert embeddings.embedding.wait(10)
+    acquired = threading.Event()
+    def reader():
+        with manager.lock.read():
+            acquired.set()
+    _start(reader)
+    assert acquired.wait(2), "readers blocked while chunks were being embedded"
+
+    embeddings.release.set()
+    ingest.join(10)
+    assert manager.vectorstore.index.ntotal == 10
+
+def test_stale_resources_are_rebuilt():
+    registry = ResourceRegistry()
+    builds = []
+    factory = lambda: builds.append(len(builds)) or {"generation": len(builds)}
+
+    first = registry.get("store", factory)
+    assert registry.get("store", factory, is_stale=lambda resource: False) is first
+    rebuilt = registry.get("store", factory, is_stale=lambda resource: resource["generation"] == 1)
+    assert rebuilt is not first and rebuilt["generation"] == 2
+    assert registry.get("store", factory) is rebuilt
+    assert len(builds) == 2
+
+def test_concurrent_gets_build_each_key_once():
+    registry = ResourceRegistry()
+    builds, lock = {}, threading.Lock()
+    start = threading.Barrier(16)
+    results = {}
+
+    def factory(key):
+        def build():
+            with lock:
+                builds[key] = builds.get(key, 0) + 1
+            time.sleep(0.05)
+            return object()
+        return build
+
+    def worker(i):
+        key = f"model-{i % 2}"
+        start.wait(10)
+        results[i] = (key, registry.get(key, factory(key)))
+
+    threads = [_start(lambda i=i: worker(i)) for i in range(16)]
+    for thread in threads:
+        thread.join(10)
+    assert builds == {"model-0": 1, "model-1": 1}
+    for key in builds:
+        assert len({id(resource) for k, resource in results.values() if k == key}) == 1
@@ -0,0 +1,25 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+HEAVY_MODULES = ("sentence_transformers", "torch", "langchain_openai", "langchain_google_genai", "langchain.memory", "langchain.chains")
+
+def test_importing_the_pipeline_does_not_load_heavy_dependencies(tmp_path):
+    code = (
+        "import sys, json, backend.rag_pipeline; "
+        f"print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=tmp_path, capture_output=True, text=True, check=True,
+        env={"PYTHONPATH": str(Path(__file__).resolve().parent.parent), "PATH": ""}
+    ).stdout
+    assert json.loads(output.strip().splitlines()[-1]) == []
+
+def test_summary_memory_still_summarizes(make_pipeline):
+    pipeline = make_pipeline()
+    pipeline.set_memory(True, mode="summary", max_token_limit=5)
+    pipeline.query("monopoly hotel rules please")
+    pipeline.query("tell me about haste for creatures")
+    pipeline.memory.wait(10)
+    assert pipeline.memory.summary
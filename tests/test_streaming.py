@@ -0,0 +1,36 @@
+import asyncio
+import time
+from langchain_core.language_models.fake import FakeStreamingListLLM
+from backend.metrics import get_metrics
+
+CONSUMER_DELAY = 0.3
+
+def _streaming_pipeline(make_pipeline):
+    pipeline = make_pipeline()
+    pipeline.resources.clear("llm")
+    pipeline.resources.get("llm", lambda: FakeStreamingListLLM(responses=["abcd"] * 10, sleep=0.05))
+    return pipeline
+
+def _generate_seconds() -> float:
+    return next(span["seconds"] for span in get_metrics().recent_spans(200) if span["stage"] == "generate")
+
+def test_generate_span_excludes_time_spent_by_the_consumer(make_pipeline):
+    pipeline = _streaming_pipeline(make_pipeline)
+    tokens = 0
+    for event in pipeline.stream_query("monopoly hotel rule"):
+        if event["type"] == "token":
+            tokens += 1
+            time.sleep(CONSUMER_DELAY)
+    assert tokens == 4
+    assert 0.15 <= _generate_seconds() < CONSUMER_DELAY
+
+def test_async_generate_span_excludes_time_spent_by_the_consumer(make_pipeline):
+    pipeline = _streaming_pipeline(make_pipeline)
+
+    async def consume():
+        async for event in pipeline.astream_query("haste lets a creature attack"):
+            if event["type"] == "token":
+                await asyncio.sleep(CONSUMER_DELAY)
+
+    asyncio.run(consume())
+    assert 0.15 <= _generate_seconds() < CONSUMER_DELAY
@@ -0,0 +1,13 @@
+from langchain_core.documents import Document
+from backend.token_budget import estimate_tokens, fit_token_budget
+
+def test_budget_skips_chunks_that_do_not_fit():
+    docs = [Document(page_content="a" * 40), Document(page_content="b" * 400), Document(page_content="c" * 40)]
+    assert [doc.page_content[0] for doc in fit_token_budget(docs, 25)] == ["a", "c"]
+
+def test_top_chunk_over_budget_is_truncated_instead_of_dropped():
+    top = Document(id="top", page_content="x" * 400, metadata={"parent_id": "p"})
+    fitted = fit_token_budget([top, Document(page_content="y" * 20)], 30)
+    assert [doc.id for doc in fitted] == ["top"]
+    assert estimate_tokens(fitted[0].page_content) == 30 and fitted[0].metadata == top.metadata
+    assert top.page_content == "x" * 400
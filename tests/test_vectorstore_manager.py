@@ -0,0 +1,170 @@
+import threading
+import time
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from backend.ann_index import index_kind
+from backend.vectorstore_manager import VectorstoreManager
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return super().embed_documents(texts)
+
+def _docs(count: int, parent: str = "p"):
+    return [
+        Document(page_content=f"{parent} chunk {i}", metadata={"parent_id": f"{parent}{i % 5}", "chunk_id": f"{parent}-c{i}"})
+        for i in range(count)
+    ]
+
+def test_rebuild_reuses_stored_vectors_instead_of_reembedding(tmp_path):
+    embeddings = CountingEmbeddings(size=16)
+    flat = VectorstoreManager(embeddings, str(tmp_path))
+    flat.store_documents(_docs(120))
+    vectors = flat.vectorstore.index.reconstruct_n(0, 120)
+    embedded = embeddings.calls
+
+    ivf = VectorstoreManager(embeddings, str(tmp_path), index_type="ivf_flat", index_params={"nprobe": 1024})
+    ivf.load()
+    assert embeddings.calls == embedded
+    assert index_kind(ivf.vectorstore.index) == "ivf_flat"
+    ivf.vectorstore.index.make_direct_map()
+    assert np.allclose(ivf.vectorstore.index.reconstruct_n(0, 120), vectors)
+
+    hnsw = VectorstoreManager(embeddings, str(tmp_path), index_type="hnsw")
+    hnsw.load()
+    assert embeddings.calls == embedded
+    assert index_kind(hnsw.vectorstore.index) == "hnsw"
+    assert hnsw.vectorstore.similarity_search("p chunk 7", k=1)[0].page_content == "p chunk 7"
+
+def test_readers_are_not_blocked_while_a_rebuild_builds(tmp_path):
+    manager = VectorstoreManager(DeterministicFakeEmbedding(size=16), str(tmp_path), index_type="ivf_flat", compact_after=1)
+    manager.store_documents(_docs(20, "a"))
+    assert index_kind(manager.vectorstore.index) == "flat"
+
+    building, release = threading.Event(), threading.Event()
+    build_store = manager._build_store
+    def slow_build(*args, **kwargs):
+        building.set()
+        release.wait(10)
+        return build_store(*args, **kwargs)
+    manager._build_store = slow_build
+
+    ingest = threading.Thread(target=manager.store_documents, args=(_docs(40, "b"),))
+    ingest.start()
+    assert building.wait(10)
+    acquired = threading.Event()
+    def reader():
+        with manager.lock.read():
+            acquired.set()
+    threading.Thread(target=reader, daemon=True).start()
+    assert acquired.wait(2), "readers blocked during the rebuild"
+    release.set()
+    ingest.join(10)
+    assert index_kind(manager.vectorstore.index) == "ivf_flat"
+    assert manager.vectorstore.index.ntotal == 60
+
+def test_adds_append_to_the_manifest_log_instead_of_rewriting_the_manifest(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    manager = VectorstoreManager(embeddings, str(tmp_path), compact_after=10)
+    manager.store_documents(_docs(10, "a"))
+    manifest = manager._manifest_path.read_bytes()
+
+    manager.store_documents(_docs(10, "b"))
+    manager.store_documents(_docs(10, "c"))
+    assert manager._manifest_path.read_bytes() == manifest
+    assert len(manager._manifest_log_path.read_text(encoding="utf-8").splitlines()) == 2
+    with open(manager._manifest_log_path, "a", encoding="utf-8") as f:
+        f.write('{"base": "torn')
+
+    reloaded = VectorstoreManager(embeddings, str(tmp_path), compact_after=10)
+    reloaded.load()
+    assert reloaded.deltas == manager.deltas
+    assert reloaded.parents == manager.parents
+    assert reloaded.vectorstore.index.ntotal == 30
+    reloaded.store_documents(_docs(10, "b"))
+    assert reloaded.vectorstore.index.ntotal == 30
+    reloaded.store_documents(_docs(10, "d"))
+    again = VectorstoreManager(embeddings, str(tmp_path), compact_after=10)
+    again.load()
+    assert again.deltas == reloaded.deltas and again.vectorstore.index.ntotal == 40
+
+    reloaded.compact()
+    assert not reloaded._manifest_log_path.exists()
+    compacted = VectorstoreManager(embeddings, str(tmp_path))
+    compacted.load()
+    assert compacted.parents == reloaded.parents and compacted.deltas == []
+
+def test_deltas_are_searched_beside_the_memory_mapped_base(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    manager = VectorstoreManager(embeddings, str(tmp_path), compact_after=10)
+    manager.store_documents(_docs(50, "a"))
+    manager.store_documents(_docs(10, "b"))
+    manager.store_documents(_docs(10, "c"))
+
+    reloaded = VectorstoreManager(embeddings, str(tmp_path), compact_after=10)
+    store = reloaded.load()
+    assert reloaded._mmapped and reloaded._delta_index.ntotal == 20 and store.index.ntotal == 70
+    assert isinstance(store.docstore._ids._offsets, np.memmap)
+    assert isinstance(reloaded.lexical_index._rows, np.memmap)
+
+    queries = ["a chunk 3", "b chunk 7", "c chunk 1"]
+    sharded = [[(doc.id, round(score, 4)) for doc, score in store.similarity_search_with_score(q, k=5)] for q in queries]
+    lexical = [reloaded.lexical_index.search(q, k=5) for q in queries]
+    assert store.similarity_search("c chunk 1", k=1)[0].page_content == "c chunk 1"
+
+    reloaded.compact()
+    assert reloaded._mmapped and reloaded._delta_index is None
+    assert isinstance(reloaded.lexical_index._rows, np.memmap)
+    assert sharded == [[(doc.id, round(score, 4)) for doc, score in store.similarity_search_with_score(q, k=5)] for q in queries]
+    assert lexical == [reloaded.lexical_index.search(q, k=5) for q in queries]
+
+def test_compaction_swaps_the_base_under_the_write_lock(tmp_path):
+    manager = VectorstoreManager(DeterministicFakeEmbedding(size=16), str(tmp_path), compact_after=10)
+    manager.store_documents(_docs(20, "a"))
+    manager.store_documents(_docs(10, "b"))
+    previous = manager._base_path
+    state = lambda: (manager.vectorstore.index, manager.vectorstore.docstore, manager.vectorstore.index_to_docstore_id, manager.lexical_index)
+
+    with manager.lock.read():
+        before = state()
+        compaction = threading.Thread(target=manager.compact)
+        compaction.start()
+        for _ in range(1000):
+            if manager.lock._waiting_writers:
+                break
+            time.sleep(0.01)
+        assert manager.lock._waiting_writers, "compaction never reached the swap"
+        assert all(a is b for a, b in zip(state(), before))
+        assert previous.exists() and len(list(tmp_path.glob("base_*"))) == 2
+
+    compaction.join(10)
+    assert not any(a is b for a, b in zip(state(), before))
+    assert not previous.exists() and [path.name for path in tmp_path.glob("base_*")] == [manager.base]
+    assert manager.vectorstore.similarity_search("b chunk 3", k=1)[0].page_content == "b chunk 3"
+
+def test_changed_or_legacy_documents_replace_their_old_chunks(make_pipeline):
+    url = "https://example.com/rules.pdf?v=1"
+    legacy = [Document(page_content=f"legacy rule {i}", metadata={"parent_id": "rules", "source": "documents/rules.pdf", "chunk_id": f"legacy-{i}"})
+              for i in range(3)]
+    pipeline = make_pipeline(docs=legacy + _docs(10, "other"))
+    manager = pipeline.vectorstore_manager
+
+    def version(content_hash):
+        return [Document(page_content=f"{content_hash} rule {i}", metadata={"parent_id": f"rules_{content_hash}", "source": url, "chunk_id": f"{content_hash}-{i}"})
+                for i in range(3)]
+
+    for content_hash in ("aaaaaaaaaaaa", "bbbbbbbbbbbb"):
+        pipeline.doc_handler.load_and_chunk_pdfs = lambda urls, **kwargs: version(content_hash)
+        pipeline.loaded_urls.clear()
+        pipeline.load_documents([url])
+
+    stored = [manager.vectorstore.index_to_docstore_id[i] for i in range(manager.vectorstore.index.ntotal)]
+    assert sorted(manager.parents) == ["other0", "other1", "other2", "other3", "other4", "rules_bbbbbbbbbbbb"]
+    assert sorted(stored) == sorted([f"other-c{i}" for i in range(10)] + [f"bbbbbbbbbbbb-{i}" for i in range(3)])
+    assert sorted(doc_id for doc_id, _ in manager.lexical_index.search("rule", k=10)) == [f"bbbbbbbbbbbb-{i}" for i in range(3)]
+    reloaded = VectorstoreManager(manager.embedding_model, manager.persist_directory)
+    reloaded.load()
+    assert sorted(reloaded.parents) == sorted(manager.parents)